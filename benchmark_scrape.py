@@ -0,0 +1,149 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from fake_wms import DEFAULT_CONFIG, expected_records, start_fake_wms
+
+# =================================================================================
+# 擷取效能測試：對離線 WMS 替身以各種模式執行 AutomationTool.run_wms_scrape (headless)，
+# 記錄每秒筆數、每頁耗時與瀏覽器記憶體峰值
+# =================================================================================
+SCRAPE_MODES = {
+    "dom-js": {"scrape_mode": "dom", "extraction_mode": "js"},
+    "dom-js-lean": {"scrape_mode": "dom", "extraction_mode": "js", "browser_profile": "lean"},
+    "dom-js-default-size": {"scrape_mode": "dom", "extraction_mode": "js", "maximize_page_size": False},
+    "dom-element": {"scrape_mode": "dom", "extraction_mode": "element"},
+    "network": {"scrape_mode": "network"},
+    "network-lean": {"scrape_mode": "network", "browser_profile": "lean"},
+    "parallel-3": {"scrape_mode": "dom", "parallel_workers": 3},
+}
+
+class RssSampler:
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        from wms_core import process_tree_rss_mb
+
+        # 本程序所有子孫程序 (chromedriver 與 Chromium) 的 RSS 總和
+        while not self._stop.is_set():
+            self.peak = max(self.peak, process_tree_rss_mb(os.getpid(), include_root=False))
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+def measure_cold_import(module="wms_core", repeat=3):
+    # 每次以新的 Python 程序匯入，取最小值 (不含直譯器本身的啟動時間)
+    code = f"import time; t = time.perf_counter(); import {module}, sys; print(time.perf_counter() - t, 'selenium' in sys.modules)"
+    samples, selenium_loaded = [], False
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.split()
+        samples.append(float(output[0]))
+        selenium_loaded = output[1] == "True"
+    return {"module": module, "import_seconds": round(min(samples), 3), "selenium_loaded": selenium_loaded}
+
+def run_benchmark(mode, url, config):
+    from wms_core import AutomationTool
+
+    tool = AutomationTool(**SCRAPE_MODES[mode])
+    started = time.perf_counter()
+    error = None
+    with RssSampler() as sampler:
+        try:
+            df = tool.run_wms_scrape(url, config["username"], config["password"])
+            records = df.to_dict("records")
+        except Exception as e:
+            records, error = [], repr(e)
+    elapsed = time.perf_counter() - started
+
+    # 每頁耗時 = 該頁的等待 + 解析 span；各階段耗時取自同一份 span
+    per_page, phases = {}, {}
+    for span in tool.telemetry.spans:
+        phases[span["name"]] = round(phases.get(span["name"], 0.0) + span["duration"], 3)
+        if span["name"] in ("page_wait", "page_parse"):
+            per_page[span["page"]] = per_page.get(span["page"], 0.0) + span["duration"]
+    page_latencies = list(per_page.values())
+    page_load = next((span for span in tool.telemetry.spans if span["name"] == "page_load"), {})
+    expected = expected_records(config)
+    key = lambda r: (r["寄送方式"], r["主要運送代碼"], r["狀態"])
+    return {
+        "mode": mode, "pages": config["pages"], "rows_per_page": config["rows_per_page"], "latency": config["latency"],
+        "scraped_pages": len(tool.checkpoint.pages) if tool.checkpoint else None,
+        "page_size": (tool.list_settings or {}).get("page_size"),
+        "rows": len(records), "expected_rows": len(expected),
+        "correct": sorted(map(key, records)) == sorted(map(key, expected)),
+        "seconds": round(elapsed, 3), "first_page_seconds": tool.first_page_seconds, "rows_per_sec": round(len(records) / elapsed, 1) if elapsed else 0.0,
+        "page_latency_mean": round(statistics.mean(page_latencies), 3) if page_latencies else None,
+        "page_latency_max": round(max(page_latencies), 3) if page_latencies else None,
+        "peak_browser_rss_mb": round(sampler.peak, 1),
+        "page_load_ms": page_load.get("load_ms"), "page_transfer_kb": page_load.get("transfer_kb"),
+        "wait_seconds": round(sum(seconds for _, seconds, _ in tool.wait_log), 3),
+        "webdriver_commands": sum(span["commands"] for span in tool.telemetry.spans),
+        "phases": phases,
+        "error": error or (repr(tool.partial_error) if getattr(tool, "partial_error", None) else None),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="WMS 擷取效能測試 (離線 WMS 替身)")
+    parser.add_argument("--modes", nargs="+", default=list(SCRAPE_MODES), choices=list(SCRAPE_MODES))
+    parser.add_argument("--pages", type=int, default=DEFAULT_CONFIG["pages"])
+    parser.add_argument("--rows-per-page", type=int, default=DEFAULT_CONFIG["rows_per_page"])
+    parser.add_argument("--latency", type=float, default=DEFAULT_CONFIG["latency"])
+    parser.add_argument("--page-size-options", type=int, nargs="*", default=DEFAULT_CONFIG["page_size_options"], help="替身提供的每頁筆數選單，例如 50 100 200")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--output", help="以 JSON lines 附加寫入結果")
+    args = parser.parse_args()
+
+    cold_import = measure_cold_import()
+    print(json.dumps(cold_import, ensure_ascii=False))
+    server, url = start_fake_wms(pages=args.pages, rows_per_page=args.rows_per_page, latency=args.latency, page_size_options=args.page_size_options)
+    results = []
+    try:
+        for mode in args.modes:
+            for _ in range(args.repeat):
+                result = run_benchmark(mode, url, server.config)
+                results.append(result)
+                print(json.dumps(result, ensure_ascii=False))
+    finally:
+        server.shutdown()
+
+    print(f"\n冷啟動匯入 wms_core：{cold_import['import_seconds']:.3f} 秒 (selenium {'已' if cold_import['selenium_loaded'] else '未'}載入)")
+    print(f"{'模式':<14}{'筆數':>8}{'正確':>6}{'秒':>9}{'首頁秒':>8}{'筆/秒':>9}{'每頁(秒)':>10}{'載入ms':>9}{'RSS峰值MB':>12}")
+    for r in results:
+        page_latency = f"{r['page_latency_mean']:.3f}" if r["page_latency_mean"] is not None else "-"
+        page_load_ms = r["page_load_ms"] if r["page_load_ms"] is not None else "-"
+        first_page = f"{r['first_page_seconds']:.2f}" if r["first_page_seconds"] is not None else "-"
+        print(f"{r['mode']:<14}{r['rows']:>8}{'Y' if r['correct'] else 'N':>6}{r['seconds']:>9.2f}{first_page:>8}{r['rows_per_sec']:>9.1f}{page_latency:>10}{page_load_ms:>9}{r['peak_browser_rss_mb']:>12.1f}")
+
+    # 精簡瀏覽器與完整瀏覽器的比較 (同一擷取模式)
+    by_mode = {r["mode"]: r for r in results if not r["error"]}
+    for mode in by_mode:
+        lean = by_mode.get(f"{mode}-lean")
+        if lean is None:
+            continue
+        full = by_mode[mode]
+        print(f"{mode}: 精簡瀏覽器 RSS 峰值 {lean['peak_browser_rss_mb'] - full['peak_browser_rss_mb']:+.1f} MB，"
+              f"頁面載入 {((lean['page_load_ms'] or 0) - (full['page_load_ms'] or 0)):+} ms，總耗時 {lean['seconds'] - full['seconds']:+.2f} 秒")
+
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(json.dumps(cold_import, ensure_ascii=False) + "\n")
+            for r in results:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+
+if __name__ == "__main__":
+    main()
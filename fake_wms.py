@@ -0,0 +1,269 @@
+import argparse
+import json
+import random
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# =================================================================================
+# 離線 WMS 替身：重現登入表單、揀包管理導覽、「揀包完成」分頁、j-loading、
+# list-items 清單 (含揀包員欄位平移與已取消標記) 與「下一頁」分頁，供效能測試使用
+# =================================================================================
+DEFAULT_CONFIG = {
+    "pages": 10,                # 「揀包完成」總頁數
+    "rows_per_page": 50,        # 預設每頁筆數
+    "page_size_options": [],    # 分頁列的「N 筆/頁」選單選項 (空 = 不提供選單)
+    "latency": 0.3,             # 清單 API 與登入 API 的延遲 (秒)
+    "picker_column_every": 3,   # 每 N 頁有一頁多出「揀包員」欄位 (0 = 不出現)
+    "cancel_ratio": 0.03,       # 已取消訂單比例
+    "seed": 42,
+    "username": "demo@jenjan.com.tw",
+    "password": "demo",
+}
+
+SHIPPING_METHODS = ['7-11', '全家', '萊爾富', 'OK', '蝦皮店到店', '蝦皮隔日配', '蝦皮店到家', '順豐特快', '順豐國際', '黑貓', '新竹物流']
+
+def build_rows(config):
+    rnd = random.Random(config["seed"])
+    rows = []
+    for i in range(config["pages"] * config["rows_per_page"]):
+        method = rnd.choice(SHIPPING_METHODS)
+        if method == '7-11' and rnd.random() < 0.3:
+            tracking_no = "".join(rnd.choice("0123456789") for _ in range(12))   # 711大物流
+        else:
+            tracking_no = f"{rnd.choice('ABCDEFGHJKLMNPQRSTUVWXYZ')}{rnd.randrange(10**10, 10**11)}"
+        rows.append({
+            "order_no": f"SO{20260000 + i:08d}",
+            "created_at": f"2026-10-17 {8 + i // 600:02d}:{i // 10 % 60:02d}",
+            "logistics_name": method,
+            "tracking_no": tracking_no,
+            "status_name": "已取消" if rnd.random() < config["cancel_ratio"] else "揀包完成",
+        })
+    return rows
+
+def expected_records(config):
+    # 爬蟲應取回的資料 (與 AutomationTool 輸出的欄位相同)，供效能測試核對
+    return [{"寄送方式": r["logistics_name"], "主要運送代碼": r["tracking_no"], "狀態": "已取消" if r["status_name"] == "已取消" else "正常"}
+            for r in build_rows(config)]
+
+APP_HTML = """<!doctype html>
+<html lang="zh-TW"><head><meta charset="utf-8"><title>WMS (offline)</title>
+<style>
+  body { font-family: sans-serif; margin: 0; }
+  .j-loading { position: fixed; inset: 0; background: rgba(255,255,255,.7); }
+  .btn { display: inline-block; padding: 6px 12px; border: 1px solid #999; cursor: pointer; }
+  .btn.active { background: #333; color: #fff; }
+  .item, .list-header { display: flex; border-bottom: 1px solid #eee; }
+  .item > div:nth-child(2), .list-header > div:nth-child(2) { display: flex; }
+  .item > div:nth-child(2) > div, .list-header > div:nth-child(2) > div { width: 140px; }
+  .m-pre-dot { color: #c00; }
+</style></head>
+<body><div id="root"></div>
+<script>
+const root = document.getElementById('root');
+const state = { tab: 'pending', page: 1, pageSize: null };
+
+async function api(path, options) {
+  const response = await fetch(path, Object.assign({ credentials: 'same-origin' }, options || {}));
+  return response.json();
+}
+
+function spinner(on) {
+  let el = document.querySelector('.j-loading');
+  if (on && !el) { el = document.createElement('div'); el.className = 'j-loading'; document.body.appendChild(el); }
+  if (!on && el) el.remove();
+}
+
+function renderLogin() {
+  root.innerHTML = `<div class="login">
+    <input type="text" id="account" placeholder="example@jenjan.com.tw">
+    <input type="password" id="password"><div id="error"></div></div>`;
+  document.getElementById('password').addEventListener('keydown', async (event) => {
+    if (event.key !== 'Enter') return;
+    spinner(true);
+    const result = await api('/api/login', { method: 'POST', headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ username: document.getElementById('account').value, password: event.target.value }) });
+    spinner(false);
+    if (result.ok) location.href = '/';
+    else document.getElementById('error').textContent = '帳號或密碼錯誤';
+  });
+}
+
+function rowHtml(row, index, pickerColumn) {
+  const cells = [`<div>${row.order_no}</div>`, `<div>${row.created_at}</div>`];
+  if (pickerColumn) cells.push('<div></div>');   // 揀包員 (未指派時空白)，後面欄位右移一格
+  cells.push(`<div>${row.logistics_name}<input type="hidden" name="logistics_id" value=""></div>`);
+  cells.push(`<div><input type="text" readonly value="${row.tracking_no}"></div>`);
+  const dot = row.status_name === '已取消' ? '<div class="m-pre-dot">已取消</div>' : '';
+  return `<div class="item"><div><label class="m-check"><input type="checkbox">${index}</label></div><div>${cells.join('')}</div>${dot}</div>`;
+}
+
+function headerHtml(pickerColumn) {
+  const titles = ['單號', '建立時間'].concat(pickerColumn ? ['揀包員'] : [], ['寄送方式', '主要運送代碼']);
+  return `<div class="list-header"><div></div><div>${titles.map(t => `<div>${t}</div>`).join('')}</div></div>`;
+}
+
+function pageSizeHtml(data) {
+  if (!data.page_size_options.length) return '';
+  const options = data.page_size_options.map(n => `<option value="${n}" ${n === data.page_size ? 'selected' : ''}>${n} 筆/頁</option>`);
+  return `<select class="page-size">${options.join('')}</select>`;
+}
+
+function pagerHtml(page, totalPages) {
+  const numbers = [];
+  for (let n = Math.max(1, page - 2); n <= Math.min(totalPages, page + 2); n++) numbers.push(`<button data-page="${n}">${n}</button>`);
+  return `<button data-page="${page - 1}" ${page <= 1 ? 'disabled' : ''}>上一頁</button>${numbers.join('')}` +
+         `<button data-page="${page + 1}" ${page >= totalPages ? 'disabled' : ''}>下一頁</button><span>共 ${totalPages} 頁</span>`;
+}
+
+async function loadList() {
+  spinner(true);
+  const result = await api(`/api/pickup/list?tab=${state.tab}&page=${state.page}&page_size=${state.pageSize || ''}`);
+  spinner(false);
+  const data = result.data;
+  const offset = (data.page - 1) * data.page_size;
+  document.querySelector('.list-head').innerHTML = headerHtml(data.picker_column);
+  document.querySelector('.list-items').innerHTML = data.list.map((row, i) => rowHtml(row, offset + i + 1, data.picker_column)).join('');
+  const pager = document.querySelector('.pager');
+  pager.innerHTML = pagerHtml(data.page, data.total_pages) + pageSizeHtml(data);
+  const sizeSelect = pager.querySelector('select.page-size');
+  if (sizeSelect) sizeSelect.addEventListener('change', () => {
+    state.pageSize = Number(sizeSelect.value); state.page = 1;
+    loadList();
+  });
+  pager.querySelectorAll('button[data-page]').forEach(button => button.addEventListener('click', () => {
+    if (button.disabled) return;
+    state.page = Number(button.dataset.page);
+    loadList();
+  }));
+}
+
+function renderPickup(content) {
+  content.innerHTML = `<div class="tabs"><div class="btn active" data-tab="pending">未揀訂單</div><div class="btn" data-tab="picked">揀包完成</div></div>
+    <div class="list-head"></div><div class="list-items"></div><div class="pager"></div>`;
+  content.querySelectorAll('.tabs .btn').forEach(tab => tab.addEventListener('click', () => {
+    content.querySelectorAll('.tabs .btn').forEach(t => t.classList.toggle('active', t === tab));
+    state.tab = tab.dataset.tab; state.page = 1; state.pageSize = null;
+    loadList();
+  }));
+  loadList();
+}
+
+async function boot() {
+  const me = await api('/api/me');
+  if (!me.ok) { renderLogin(); return; }
+  root.innerHTML = `<div id="page-container"><nav><a href="/admin/pickup">揀包管理</a></nav><div id="content"></div></div>`;
+  if (location.pathname.startsWith('/admin/pickup')) renderPickup(document.getElementById('content'));
+}
+boot();
+</script></body></html>
+"""
+
+class FakeWMSHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _session(self):
+        for part in self.headers.get("Cookie", "").split(";"):
+            name, _, value = part.strip().partition("=")
+            if name == "sid" and value in self.server.sessions:
+                return value
+        return None
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if parsed.path == "/api/me":
+            return self._send_json({"ok": self._session() is not None})
+        if parsed.path == "/api/pickup/list":
+            if self._session() is None:
+                return self._send_json({"ok": False, "message": "unauthorized"}, status=401)
+            time.sleep(self.server.config["latency"])
+            query = parse_qs(parsed.query)
+            page_size = query.get("page_size", [""])[0]
+            return self._send_json(self.server.list_page(query.get("tab", ["pending"])[0], int(query.get("page", ["1"])[0]),
+                                                         int(page_size) if page_size.isdigit() else None))
+        body = APP_HTML.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/api/login":
+            return self._send_json({"ok": False}, status=404)
+        time.sleep(self.server.config["latency"])
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            payload = {}
+        config = self.server.config
+        if payload.get("username") != config["username"] or payload.get("password") != config["password"]:
+            return self._send_json({"ok": False})
+        sid = secrets.token_hex(16)
+        self.server.sessions.add(sid)
+        return self._send_json({"ok": True}, headers={"Set-Cookie": f"sid={sid}; Path=/"})
+
+class FakeWMSServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config):
+        super().__init__(address, FakeWMSHandler)
+        self.config = config
+        self.sessions = set()
+        self.picked_rows = build_rows(config)
+        self.pending_rows = build_rows({**config, "pages": 1, "rows_per_page": 5, "seed": config["seed"] + 1})
+
+    def list_page(self, tab, page, page_size=None):
+        rows = self.picked_rows if tab == "picked" else self.pending_rows
+        size_options = list(self.config["page_size_options"]) if tab == "picked" else []
+        if page_size not in size_options:
+            page_size = self.config["rows_per_page"] if tab == "picked" else 5
+        total_pages = max(1, -(-len(rows) // page_size))
+        page = min(max(page, 1), total_pages)
+        every = self.config["picker_column_every"]
+        return {"code": 0, "data": {
+            "list": rows[(page - 1) * page_size:page * page_size],
+            "page": page, "page_size": page_size, "page_size_options": size_options, "total": len(rows), "total_pages": total_pages,
+            "picker_column": bool(tab == "picked" and every and page % every == 0),
+        }}
+
+def start_fake_wms(host="127.0.0.1", port=0, **overrides):
+    # 於背景執行緒啟動，回傳 (server, url)；結束時呼叫 server.shutdown()
+    config = {**DEFAULT_CONFIG, **overrides}
+    server = FakeWMSServer((host, port), config)
+    threading.Thread(target=server.serve_forever, name="fake-wms", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="離線 WMS 替身伺服器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pages", type=int, default=DEFAULT_CONFIG["pages"])
+    parser.add_argument("--rows-per-page", type=int, default=DEFAULT_CONFIG["rows_per_page"])
+    parser.add_argument("--latency", type=float, default=DEFAULT_CONFIG["latency"])
+    parser.add_argument("--picker-column-every", type=int, default=DEFAULT_CONFIG["picker_column_every"])
+    parser.add_argument("--cancel-ratio", type=float, default=DEFAULT_CONFIG["cancel_ratio"])
+    parser.add_argument("--page-size-options", type=int, nargs="*", default=DEFAULT_CONFIG["page_size_options"], help="例如 50 100 200")
+    args = parser.parse_args()
+    config = {**DEFAULT_CONFIG, "pages": args.pages, "rows_per_page": args.rows_per_page, "latency": args.latency,
+              "picker_column_every": args.picker_column_every, "cancel_ratio": args.cancel_ratio, "page_size_options": args.page_size_options}
+    server = FakeWMSServer((args.host, args.port), config)
+    print(f"Fake WMS: http://{args.host}:{server.server_address[1]}/  (帳號 {config['username']} / 密碼 {config['password']})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -1,28 +1,26 @@
 import streamlit as st
 import pandas as pd
 import datetime
-import time
-import json
 import os
-import traceback
-from shutil import which
+import atexit
+import uuid
+from collections import deque
 from zoneinfo import ZoneInfo
-import streamlit.components.v1 as components
 import html
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from webdriver_manager.chrome import ChromeDriverManager
+from wms_core import (
+    BrowserSessionManager, ScrapeJobRunner, process_and_output_data,
+    MAX_PARALLEL_WORKERS, MAX_LIVE_BROWSERS, INCREMENTAL_STOP_PAGES, EXCEL_ENGINE, PARQUET_AVAILABLE, XLSX_MIME,
+    DEFAULT_WMS_URL, CREDENTIALS_FILE_WMS, load_credentials, save_credentials, clear_credentials,
+    ACCOUNTS_FILE_WMS, load_accounts, save_accounts, normalize_accounts, fill_saved_passwords,
+    LOG_LEVELS,
+)
 
 # =================================================================================
 # 自訂複製按鈕
 # =================================================================================
 def create_copy_button(text_to_copy: str, button_text: str, key: str):
+    # 只有在有結果可複製時才會呼叫，元件模組延後載入以縮短冷啟動
+    import streamlit.components.v1 as components
     escaped_text = html.escape(text_to_copy)
     button_html = f"""
     <html><head><style>
@@ -59,339 +57,35 @@ def create_copy_button(text_to_copy: str, button_text: str, key: str):
     """
     return components.html(button_html, height=45)
 
-# =================================================================================
-# 核心爬蟲邏輯
-# =================================================================================
-class AutomationTool:
-    def __init__(self, status_callback=None):
-        self.status_callback = status_callback
-
-    def _update_status(self, message):
-        if self.status_callback: 
-            self.status_callback(message)
-
-    def _initialize_driver(self):
-        chrome_options = Options()
-        chrome_options.add_argument("--headless=new") 
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--window-size=1920,1080")
-        
-        # 強制瀏覽器使用繁體中文
-        chrome_options.add_argument("--lang=zh-TW")
-        prefs = {"intl.accept_languages": "zh-TW,zh,zh-CN"}
-        chrome_options.add_experimental_option("prefs", prefs)
-        chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
-        
-        chrome_binary = which("chromium") or which("chromium-browser")
-        if chrome_binary:
-            chrome_options.binary_location = chrome_binary
-            self._update_status(f"  > 找到 Chromium 路徑: {chrome_binary}")
-
-        self._update_status("  > 正在初始化 WebDriver...")
-        try:
-            chromedriver_path = which("chromedriver")
-            if chromedriver_path:
-                self._update_status(f"  > 使用系統內建 ChromeDriver: {chromedriver_path}")
-                service = Service(executable_path=chromedriver_path)
-                driver = webdriver.Chrome(service=service, options=chrome_options)
-            else:
-                self._update_status("  > 未找到系統 ChromeDriver，啟動 webdriver_manager 自動下載...")
-                service = Service(ChromeDriverManager().install())
-                driver = webdriver.Chrome(service=service, options=chrome_options)
-        except Exception as e:
-            self._update_status(f"❌ WebDriver 初始化失敗: {e}")
-            raise e
-        return driver
-
-    def _login_wms(self, driver, url, username, password):
-        self._update_status("  > 正在前往 WMS 登入頁面...")
-        driver.get(url)
-        account_xpath = "//input[@placeholder='example@jenjan.com.tw']"
-        password_xpath = "//input[@type='password']"
-        account_input = WebDriverWait(driver, 20).until(EC.element_to_be_clickable((By.XPATH, account_xpath)))
-        account_input.click(); account_input.send_keys(username)
-        password_input = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.XPATH, password_xpath)))
-        password_input.click(); password_input.send_keys(password)
-        password_input.send_keys(Keys.ENTER)
-        WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.ID, "page-container")))
-        self._update_status("✅ [成功] WMS 登入完成！")
-        time.sleep(3)
-        
-    def _navigate_to_picking_complete(self, driver):
-        self._update_status("  > 尋找導覽菜單...")
-        picking_management_xpath = "//a[@href='/admin/pickup']"
-        WebDriverWait(driver, 30).until(EC.element_to_be_clickable((By.XPATH, picking_management_xpath))).click()
-        
-        self._update_status("  > 正在等待並準備切換至「揀包完成」分頁...")
-        time.sleep(4) 
-        
-        # 尋找 class 包含 btn，且其內部文字包含「揀包完成」的區塊
-        picking_complete_tab_xpath = "//div[contains(@class, 'btn') and contains(., '揀包完成')]"
-        
-        try:
-            tab_element = WebDriverWait(driver, 20).until(
-                EC.presence_of_element_located((By.XPATH, picking_complete_tab_xpath))
-            )
-            self._update_status("  > 🎯 鎖定目標分頁：揀包完成！準備點擊...")
-            
-            driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", tab_element)
-            time.sleep(1)
-            
-            # 優先使用標準點擊，若被擋住再用 JS 點擊 (確保框架狀態更新)
-            try:
-                tab_element.click()
-            except:
-                driver.execute_script("arguments[0].click();", tab_element)
-            
-            self._update_status("✅ [成功] 已點擊揀包完成頁面！等待系統載入資料...")
-            time.sleep(4)
-            
-            driver.save_screenshot("debug_tab_switched.png")
-            
-        except TimeoutException as e:
-            driver.save_screenshot("error_screenshot.png")
-            self._update_status("📸 [除錯] 切換分頁失敗，已擷取錯誤發生時的畫面截圖。")
-            raise e
-
-    def _scrape_data(self, driver):
-        # ⚠️ 關鍵修復 1：取消點擊查詢按鈕！避免網頁重置跳回「未揀訂單」
-        # self._update_status("  > 點擊查詢按鈕以載入資料...")
-        # query_button_xpath = "//div[contains(@class, 'btn-primary')] | //button[contains(@class, 'btn-primary')]"
-        # WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.XPATH, query_button_xpath))).click()
-        
-        loading_spinner_xpath = "//div[contains(@class, 'j-loading')]"
-        try:
-            self._update_status("  > 等待資料表載入更新...")
-            WebDriverWait(driver, 15).until(EC.invisibility_of_element_located((By.XPATH, loading_spinner_xpath)))
-        except:
-            pass 
-            
-        self._update_status("  > 資料已初步載入，開始解析。")
-        time.sleep(3) 
-        
-        all_pages_data = []
-        page_count = 1
-        item_list_container_xpath = "//div[contains(@class, 'list-items')]"
-        counter_label_xpath = "(//div[contains(@class, 'item') and .//label[contains(@class, 'm-check')]])[1]//label[contains(@class, 'm-check')]"
-        
-        while True:
-            self._update_status(f"  > 準備抓取第 {page_count} 頁的資料...")
-            label_text_before_click = ""
-            
-            try:
-                counter_label_element = WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.XPATH, counter_label_xpath))
-                )
-                label_text_before_click = counter_label_element.text
-                current_page_rows = driver.find_elements(By.XPATH, f"{item_list_container_xpath}/div[contains(@class, 'item')]")
-                self._update_status(f"  > 找到 {len(current_page_rows)} 筆項目，正在智慧提取...")
-            except TimeoutException:
-                self._update_status(f"  > 在第 {page_count} 頁未找到任何項目，抓取結束。")
-                break
-
-            single_page_data = []
-            for row in current_page_rows:
-                try:
-                    # ⚠️ 關鍵修復 2：智能表格解析 (容許無 input 標籤或欄位平移)
-                    shipping_method = ""
-                    tracking_code = ""
-                    
-                    try:
-                        # 嘗試常規位置
-                        shipping_method = row.find_element(By.XPATH, "./div[2]/div[3]").text.strip()
-                        tracking_col = row.find_element(By.XPATH, "./div[2]/div[4]")
-                        inputs = tracking_col.find_elements(By.XPATH, ".//input")
-                        tracking_code = inputs[0].get_property('value').strip() if inputs else tracking_col.text.strip()
-                    except:
-                        pass
-                        
-                    # 如果常規位置沒抓到，可能是因為多了一個「揀包員」欄位導致平移，試著往右抓一格
-                    if not shipping_method and not tracking_code:
-                        try:
-                            shipping_method = row.find_element(By.XPATH, "./div[2]/div[4]").text.strip()
-                            tracking_col = row.find_element(By.XPATH, "./div[2]/div[5]")
-                            inputs = tracking_col.find_elements(By.XPATH, ".//input")
-                            tracking_code = inputs[0].get_property('value').strip() if inputs else tracking_col.text.strip()
-                        except:
-                            pass
-
-                    status = '正常'
-                    try:
-                        canceled_div = row.find_elements(By.XPATH, ".//div[contains(@class, 'm-pre-dot') and contains(text(), '已取消')]")
-                        if canceled_div: status = '已取消'
-                    except Exception: pass
-                    
-                    # 只要有抓到物流或追蹤碼，就當作有效資料
-                    if shipping_method or tracking_code:
-                        single_page_data.append({
-                            "寄送方式": shipping_method, "主要運送代碼": tracking_code, "狀態": status
-                        })
-                except Exception as e:
-                    continue
-            
-            all_pages_data.append(single_page_data)
-            total_items_collected = sum(len(page) for page in all_pages_data)
-            
-            # ⚠️ 關鍵修復 3：詳細日誌，讓你知道到底漏抓了多少筆
-            self._update_status(f"✅ 第 {page_count} 頁解析完畢。畫面有 {len(current_page_rows)} 筆，成功提取 {len(single_page_data)} 筆。累計 {total_items_collected} 筆。")
-
-            try:
-                next_button_xpath = "//button[normalize-space()='下一頁' or normalize-space()='Next']"
-                next_button_element = driver.find_element(By.XPATH, next_button_xpath)
-                
-                if next_button_element.get_attribute('disabled'):
-                    self._update_status("  > 「下一頁」按鈕已禁用，抓取結束。")
-                    break
-                
-                driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", next_button_element)
-                time.sleep(0.2)
-                next_button_element.click()
-                self._update_status(f"  > 已點擊「下一頁」，正在等待頁面更新...")
-
-                wait = WebDriverWait(driver, 30)
-                wait.until(lambda d: d.find_element(By.XPATH, counter_label_xpath).text != label_text_before_click)
-                page_count += 1
-            except (TimeoutException, NoSuchElementException, Exception):
-                self._update_status(f"  > 翻頁條件未滿足，抓取結束。")
-                break
-                
-        final_data = [item for page_list in all_pages_data for item in page_list]
-        self._update_status(f"  > 所有資料抓取合併完成，最終總筆數: {len(final_data)}")
-        return final_data
-
-    def run_wms_scrape(self, url, username, password):
-        driver = None
-        try:
-            driver = self._initialize_driver()
-            self._login_wms(driver, url, username, password)
-            self._navigate_to_picking_complete(driver)
-            data = self._scrape_data(driver)
-            return pd.DataFrame(data)
-        except Exception as e:
-            raise e
-        finally:
-            if driver: driver.quit()
+@st.cache_resource
+def get_browser_session_manager():
+    # 整個伺服器程序共用一個管理器，閒置的瀏覽器由背景執行緒定期關閉
+    manager = BrowserSessionManager()
+    manager.start_reaper()
+    atexit.register(manager.close_all)
+    return manager
 
-# =================================================================================
-# 資料處理與報告生成
-# =================================================================================
-def generate_report_text(df_to_process, display_timestamp, report_title, show_status=False):
-    df_display = df_to_process.copy()
-    
-    cols_to_drop = ['分組']
-    if not show_status:
-        cols_to_drop.append('狀態')
-        
-    df_display = df_display.drop(columns=[c for c in cols_to_drop if c in df_display.columns], errors='ignore')
-
-    if df_display.empty or len(df_display) == 0:
-        summary = f"--- {report_title} ---\n\n此分類下無資料。"
-        full_report = f"擷取時間: {display_timestamp} (台北時間)\n\n{summary}"
-        return summary, full_report
-    
-    summary_lines = ["==============================", f"=== {report_title} ===", "=============================="]
-    
-    summary_df = df_display.groupby('寄送方式', observed=False).size().reset_index(name='數量')
-    total_count = len(df_display)
-    max_len = summary_df['寄送方式'].astype(str).str.len().max() + 2 if not summary_df.empty else 10
-    
-    for _, row in summary_df.iterrows():
-        if row['數量'] > 0:
-            method_part = f"{row['寄送方式']}:"
-            count_part = str(row['數量'])
-            line = f"{method_part:<{max_len}} {count_part:>8}"
-            summary_lines.append(line)
-                
-    summary_lines.append("\n------------------------------")
-    summary_lines.append(f"總計: {total_count}")
-    summary_text = "\n".join(summary_lines)
-    
-    details_text = df_display.to_string(index=False)
-    
-    full_report_text = (f"擷取時間: {display_timestamp} (台北時間)\n\n{summary_text}\n\n"
-                      "==============================\n======== 資 料 明 細 ========\n==============================\n\n"
-                      f"{details_text}")
-    return summary_text, full_report_text
-
-def process_and_output_data(df, status_callback):
-    now = datetime.datetime.now(ZoneInfo("Asia/Taipei"))
-    display_timestamp = now.strftime("%Y-%m-%d %H:%M")
-
-    status_callback("  > 拆分已取消與正常訂單...")
-    df_canceled = df[df['狀態'] == '已取消'].copy()
-    df_processing = df[df['狀態'] != '已取消'].copy()
-    
-    status_callback("  > 細分正常訂單組...")
-    df_processing['主要運送代碼'] = df_processing['主要運送代碼'].astype(str)
-    condition = (df_processing['寄送方式'] == '7-11') & (df_processing['主要運送代碼'].str.match(r'^\d', na=False))
-    df_processing.loc[condition, '寄送方式'] = '711大物流'
-    
-    group_mapping = {
-        '7-11': '第一組', '711大物流': '第一組', '全家': '第一組', '萊爾富': '第一組', '萊爾福': '第一組', 'OK': '第一組', '蝦皮店到店': '第一組',
-        '蝦皮隔日配': '第二組', '蝦皮店到家': '第二組',
-        '順豐特快': '第三組', '順豐國際': '第三組',
-        '黑貓': '第四組',
-        '新竹物流': '第五組'
-    }
-    
-    df_processing['分組'] = df_processing['寄送方式'].map(group_mapping).fillna('其他')
-    df_canceled['分組'] = df_canceled['寄送方式'].map(group_mapping).fillna('其他')
-    df['分組'] = df['寄送方式'].map(group_mapping).fillna('其他')
-    
-    priority_order = [
-        '7-11', '711大物流', '全家', '萊爾富', '萊爾福', 'OK', '蝦皮店到店', 
-        '蝦皮隔日配', '蝦皮店到家', 
-        '順豐特快', '順豐國際', 
-        '黑貓', 
-        '新竹物流'
-    ]
-    
-    processing_methods = df_processing['寄送方式'].unique().tolist()
-    processing_order = [m for m in priority_order if m in processing_methods] + sorted([m for m in processing_methods if m not in priority_order])
-    df_processing['寄送方式'] = pd.Categorical(df_processing['寄送方式'], categories=processing_order, ordered=True)
-    
-    group_order = ['第一組', '第二組', '第三組', '第四組', '第五組', '其他']
-    df_processing['分組'] = pd.Categorical(df_processing['分組'], categories=group_order, ordered=True)
-    df_processing_sorted = df_processing.sort_values(by=['分組', '寄送方式'])
-    
-    st.session_state.final_df = df_processing_sorted
-    st.session_state.df_canceled = df_canceled
-    st.session_state.file_timestamp = now.strftime("%y%m%d%H%M")
-    
-    reports = {}
-    for g in group_order:
-        df_g = df_processing_sorted[df_processing_sorted['分組'] == g]
-        if not df_g.empty:
-            reports[g] = generate_report_text(df_g, display_timestamp, f"{g} 統計")[1]
-        else:
-            reports[g] = None
-            
-    reports['all'] = generate_report_text(df_processing_sorted, display_timestamp, "所有正常項目統計")[1]
-    reports['canceled'] = generate_report_text(df_canceled, display_timestamp, "已取消項目統計", show_status=True)[1]
-    
-    st.session_state.report_texts = reports
-    status_callback("✅ 資料處理完成！")
-
-CREDENTIALS_FILE_WMS = "credentials_wms.json"
-def load_credentials(file_path):
-    if os.path.exists(file_path):
-        try:
-            with open(file_path, 'r') as f: return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError): return {}
-    return {}
-def save_credentials(file_path, username, password):
-    with open(file_path, 'w') as f: json.dump({"username": username, "password": password}, f)
-def clear_credentials(file_path):
-    if os.path.exists(file_path): os.remove(file_path)
-
-def append_to_log(message):
-    timestamp = datetime.datetime.now(ZoneInfo("Asia/Taipei")).strftime("%H:%M:%S")
-    log_line = f"[{timestamp}] {message}"
+@st.cache_resource
+def get_job_runner():
+    return ScrapeJobRunner(session_manager=get_browser_session_manager())
+
+# 頁面上只保留最近的日誌 (環狀緩衝區)，完整內容在每次執行的日誌檔中
+UI_LOG_LINES = 300
+
+def append_to_log(message, level="INFO", timestamp=None):
+    timestamp = timestamp or datetime.datetime.now(ZoneInfo("Asia/Taipei")).strftime("%H:%M:%S")
     if 'app_logs' not in st.session_state:
-        st.session_state.app_logs = []
-    st.session_state.app_logs.append(log_line)
+        st.session_state.app_logs = deque(maxlen=UI_LOG_LINES)
+    st.session_state.app_logs.append((level, f"[{timestamp}] {message}"))
+
+def show_text_area(label, text, key, height):
+    # 有 key 的 text_area 會沿用上一次的內容，內容改變 (新結果、自訂文字、日誌等級) 時直接更新其狀態
+    st.session_state[key] = text
+    st.text_area(label, height=height, key=key, label_visibility="collapsed")
+
+def read_file_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
 
 # =================================================================================
 # Streamlit 前端介面
@@ -403,16 +97,54 @@ if 'final_df' not in st.session_state: st.session_state.final_df = pd.DataFrame(
 if 'df_canceled' not in st.session_state: st.session_state.df_canceled = pd.DataFrame()
 if 'report_texts' not in st.session_state: st.session_state.report_texts = {}
 if 'duck_index' not in st.session_state: st.session_state.duck_index = 0
-if 'app_logs' not in st.session_state: st.session_state.app_logs = []
+if 'app_logs' not in st.session_state: st.session_state.app_logs = deque(maxlen=UI_LOG_LINES)
+if 'subscriber_id' not in st.session_state: st.session_state.subscriber_id = uuid.uuid4().hex
+if 'active_job_id' not in st.session_state: st.session_state.active_job_id = None
+if 'accounts_editor_version' not in st.session_state: st.session_state.accounts_editor_version = 0
 
 with st.sidebar:
     st.image("https://www.jenjan.com.tw/images/logo.svg", width=200)
     with st.expander("⚙️ WMS 設定", expanded=True):
         wms_creds = load_credentials(CREDENTIALS_FILE_WMS)
-        wms_url = st.text_input("WMS URL", value="https://wms.jenjan.com.tw/", key="wms_url")
+        wms_url = st.text_input("WMS URL", value=DEFAULT_WMS_URL, key="wms_url")
         wms_username = st.text_input("WMS 帳號", value=wms_creds.get("username", ""), key="wms_user")
         wms_password = st.text_input("WMS 密碼", value=wms_creds.get("password", ""), type="password", key="wms_pass")
         wms_remember = st.checkbox("記住 WMS 帳密", value=bool(wms_creds), key="wms_rem")
+        scrape_mode_labels = {"dom": "DOM 解析", "network": "網路擷取 (讀取清單 API)"}
+        wms_scrape_mode = st.selectbox("擷取模式", options=list(scrape_mode_labels), format_func=scrape_mode_labels.get, key="wms_scrape_mode")
+        wms_keep_browser = st.checkbox("保持瀏覽器登入 (加速重複擷取)", value=True, key="wms_keep_browser")
+        wms_incremental = st.checkbox("增量擷取 (遇到已抓過的頁面即停止，報告由本機資料庫產生)", value=False, key="wms_incremental",
+                                      help=f"連續 {INCREMENTAL_STOP_PAGES} 頁都是已抓過的資料就停止翻頁，只有讀到的頁面會更新狀態："
+                                           "停止位置之後的舊訂單若之後才被取消，不會列入「新取消」，請定期做一次完整擷取。")
+        browser_profile_labels = {"full": "完整瀏覽器", "lean": "精簡瀏覽器 (封鎖圖片/字型，較省記憶體)"}
+        wms_browser_profile = st.selectbox("瀏覽器設定檔", options=list(browser_profile_labels), format_func=browser_profile_labels.get, key="wms_browser_profile")
+        wms_parallel_workers = st.number_input("平行瀏覽器數量 (DOM 模式)", min_value=1, max_value=MAX_PARALLEL_WORKERS, value=1, step=1, key="wms_parallel_workers")
+        wms_date_filter = st.checkbox("只擷取今日 (套用 WMS 的日期篩選，若清單有提供)", value=False, key="wms_date_filter")
+        wms_debug_capture = st.checkbox("🐞 除錯擷取 (保留切換分頁與錯誤時的畫面，僅存於本次執行)", value=False, key="wms_debug_capture")
+    with st.expander("👥 多帳號擷取", expanded=False):
+        wms_multi_account = st.toggle("同時擷取下列所有帳號 (取代上方單一帳號)", key="wms_multi_account")
+        # 已儲存的密碼只留在伺服器端，表格的密碼欄一律空白 (空白 = 沿用已儲存的密碼)
+        saved_account_list = load_accounts(ACCOUNTS_FILE_WMS)
+        saved_accounts = pd.DataFrame(saved_account_list, columns=["name", "url", "username", "password"]).assign(password="")
+        edited_accounts = st.data_editor(saved_accounts, num_rows="dynamic", hide_index=True, use_container_width=True,
+                                         key=f"wms_accounts_editor_{st.session_state.accounts_editor_version}",
+                                         column_config={"name": "名稱", "url": "WMS URL (空白 = 預設)", "username": "帳號",
+                                                        "password": st.column_config.TextColumn("新密碼 (空白 = 沿用已儲存)")})
+        edited_account_items = fill_saved_passwords(edited_accounts.to_dict("records"), saved_account_list)
+        # 保持登入時瀏覽器由整個伺服器共用的管理器提供，上限固定為 MAX_LIVE_BROWSERS
+        if wms_keep_browser:
+            wms_max_browsers = st.number_input(f"同時執行的瀏覽器上限 (保持登入時最多 {MAX_LIVE_BROWSERS} 個，與其他擷取共用)", min_value=1, max_value=MAX_LIVE_BROWSERS,
+                                               value=MAX_LIVE_BROWSERS, step=1, key="wms_max_browsers_shared")
+        else:
+            wms_max_browsers = st.number_input("同時執行的瀏覽器上限", min_value=1, max_value=MAX_PARALLEL_WORKERS, value=MAX_LIVE_BROWSERS, step=1, key="wms_max_browsers")
+        if st.button("💾 儲存帳號清單", key="save_wms_accounts"):
+            save_accounts(ACCOUNTS_FILE_WMS, normalize_accounts(edited_account_items))
+            # 換一個表格 key，下次重跑以遮蔽密碼的已儲存清單重新顯示，剛輸入的密碼不再留在表格中
+            st.session_state.accounts_editor_version += 1
+            missing = [item.get("username") for item in edited_account_items if isinstance(item.get("username"), str) and item["username"].strip() and not item.get("password")]
+            st.success("已儲存帳號清單。")
+            if missing:
+                st.warning(f"⚠️ 下列帳號沒有密碼，未儲存: {', '.join(missing)}")
     st.warning("⚠️ **安全性提醒**:\n勾選「記住」會將帳密以可讀取的形式保存在伺服器上。")
 
 st.title("🚚 WMS 自動化資料擷取工具")
@@ -421,69 +153,176 @@ st.header("從 WMS 擷取今日資料")
 if st.button("🚀 開始擷取 WMS 資料", type="primary", use_container_width=True):
     if wms_remember: save_credentials(CREDENTIALS_FILE_WMS, wms_username, wms_password)
     else: clear_credentials(CREDENTIALS_FILE_WMS)
-    
-    st.session_state.wms_scraping_done = False
-    st.session_state.app_logs = [] 
-    st.session_state.duck_index = 0
-    
-    progress_text = st.empty()
-    progress_duck = st.empty()
-    duck_images = ["duck_0.png", "duck_1.png", "duck_2.png", "duck_3.png", "duck_4.png"]
-    
-    def streamlit_callback(message):
-        append_to_log(message)
-        text = message.replace("  > ", "").replace("...", "")
-        
-        if "登入完成" in message and st.session_state.duck_index < 1: st.session_state.duck_index = 1
-        elif "進入揀包完成頁面" in message and st.session_state.duck_index < 2: st.session_state.duck_index = 2
-        elif "所有頁面資料抓取完畢" in message and st.session_state.duck_index < 3: st.session_state.duck_index = 3
-        elif "資料處理完成" in message and st.session_state.duck_index < 4: st.session_state.duck_index = 4
-        
-        progress_text.info(f"{text}...")
-        if os.path.exists(duck_images[st.session_state.duck_index]):
-            progress_duck.image(duck_images[st.session_state.duck_index])
-
-    try:
-        if not wms_username or not wms_password:
-            st.error("❌ 請務必輸入 WMS 帳號和密碼！")
-            append_to_log("❌ 錯誤：未輸入帳號或密碼")
-        else:
-            streamlit_callback("準備開始... 🐣")
-            tool = AutomationTool(status_callback=streamlit_callback)
-            result_df = tool.run_wms_scrape(wms_url, wms_username, wms_password)
-            
-            if result_df is not None and not result_df.empty:
-                process_and_output_data(result_df, streamlit_callback)
-                st.session_state.wms_scraping_done = True
-                time.sleep(1); progress_text.empty(); progress_duck.empty()
-                st.success("🎉 WMS 任務完成！")
-            elif result_df is not None and result_df.empty:
-                progress_text.empty(); progress_duck.empty()
-                st.warning("⚠️ WMS 抓取完成，但沒有收到任何資料。")
-                append_to_log("⚠️ 警告：抓取完成，但回傳資料為空。")
-            else: 
-                progress_text.empty(); progress_duck.empty()
-                st.error("❌ 執行 WMS 任務時發生預期外錯誤。")
-                append_to_log("❌ 錯誤：回傳結果為 None。")
-                
-    except Exception as e:
-        error_traceback = traceback.format_exc()
-        append_to_log(f"❌ 發生致命例外錯誤:\n{error_traceback}")
-        progress_text.empty(); progress_duck.empty()
-        st.error("❌ 執行 WMS 任務時發生致命錯誤，請查看最下方的「系統日誌」！")
-        
-        if os.path.exists("error_screenshot.png"):
-            st.warning("📸 以下是出錯瞬間的畫面：")
-            st.image("error_screenshot.png")
-            os.remove("error_screenshot.png") 
+
+    wms_accounts = normalize_accounts(edited_account_items) if wms_multi_account else None
+    if wms_multi_account and not wms_accounts:
+        st.error("❌ 多帳號擷取需要至少一組完整的帳號與密碼！")
+        append_to_log("❌ 錯誤：多帳號清單沒有可用的帳號", level="ERROR")
+    elif not wms_multi_account and (not wms_username or not wms_password):
+        st.error("❌ 請務必輸入 WMS 帳號和密碼！")
+        append_to_log("❌ 錯誤：未輸入帳號或密碼", level="ERROR")
+    else:
+        st.session_state.wms_scraping_done = False
+        st.session_state.app_logs = deque(maxlen=UI_LOG_LINES)
+        st.session_state.run_log_path = None
+        st.session_state.pop("copy_ready_logs", None)
+        st.session_state.duck_index = 0
+        st.session_state.debug_captures = None
+        options = {"scrape_mode": wms_scrape_mode, "keep_browser": wms_keep_browser,
+                   "incremental": wms_incremental, "parallel_workers": int(wms_parallel_workers),
+                   "browser_profile": wms_browser_profile, "max_browsers": int(wms_max_browsers),
+                   "debug_capture": wms_debug_capture, "date_filter": wms_date_filter}
+        job, shared = get_job_runner().submit(wms_url, wms_username, wms_password, options, st.session_state.subscriber_id, accounts=wms_accounts)
+        st.session_state.active_job_id = job.job_id
+        st.session_state.job_event_cursor = 0
+        append_to_log("準備開始... 🐣")
+        if shared:
+            append_to_log(f"♻️ 已有相同帳號與設定的擷取工作 ({job.job_id})，直接共用其進度與結果。")
+
+def apply_scrape_result(result):
+    reports = result["reports"]
+    st.session_state.store_diff = result["store_diff"]
+    st.session_state.account_outcomes = result.get("accounts")
+    st.session_state.final_df = reports["final_df"]
+    st.session_state.df_canceled = reports["df_canceled"]
+    st.session_state.file_timestamp = reports["file_timestamp"]
+    st.session_state.report_texts = reports["report_texts"]
+    st.session_state.display_timestamp = reports["display_timestamp"]
+    st.session_state.report_downloads = reports["downloads"]
+    # 新結果的預覽頁次與「準備複製」狀態重新開始
+    for key in [k for k in st.session_state if k.startswith(("copy_ready_", "preview_page_"))]:
+        del st.session_state[key]
+    st.session_state.wms_scraping_done = True
+
+# 背景工作進度：每秒輪詢一次，只重繪此區塊；工作結束後整頁重跑以顯示結果
+DUCK_IMAGES = ["duck_0.png", "duck_1.png", "duck_2.png", "duck_3.png", "duck_4.png"]
+DUCK_PHASES = {"login": 1, "navigation": 2, "scrape": 3, "report": 4}
+
+@st.fragment(run_every=1.0)
+def job_progress_panel():
+    job = get_job_runner().get(st.session_state.get('active_job_id'))
+    if job is None:
+        return
+    # 每秒輪詢一次即為合併視窗：這段時間內的訊息一次加入，過多時只取緩衝區內較新的部分
+    events, st.session_state.job_event_cursor, skipped = job.events_since(st.session_state.job_event_cursor)
+    if skipped:
+        append_to_log(f"  > …略過 {skipped} 則較舊的訊息 (完整內容請下載日誌檔)", level="DEBUG")
+    for _, timestamp, level, message in events:
+        append_to_log(message, level=level, timestamp=timestamp)
+    st.session_state.run_log_path = job.log.path
+
+    if not job.done:
+        st.session_state.duck_index = max([st.session_state.duck_index] + [DUCK_PHASES[p] for p in job.completed_phases if p in DUCK_PHASES])
+        last_message = st.session_state.app_logs[-1][1].split("] ", 1)[-1] if st.session_state.app_logs else "排隊中"
+        st.info(f"{last_message.replace('  > ', '').replace('...', '')}...")
+        if os.path.exists(DUCK_IMAGES[st.session_state.duck_index]):
+            st.image(DUCK_IMAGES[st.session_state.duck_index])
+        progress = job.progress
+        if progress:
+            st.caption(f"擷取中：已完成 {progress['pages']} 頁，共 {progress['rows']} 筆 (各組累計)")
+            metric_cols = st.columns(len(progress["groups"]) + 1)
+            for col, (g, count) in zip(metric_cols, progress["groups"].items()):
+                col.metric(g, count)
+            metric_cols[-1].metric("已取消", progress["canceled"])
+            if progress["rows"] and st.button("📄 先產生目前已擷取的報告", key=f"partial_{job.job_id}"):
+                # 以目前已完成的頁面產生報告，讓揀貨可以先開始；擷取完成後會以完整結果取代
+                apply_scrape_result({"store_diff": None, "reports": process_and_output_data(job.partial_frame(), lambda message, level="INFO": None)})
+                st.session_state.job_notice = ("info", f"📄 以下為前 {progress['pages']} 頁的暫時結果，擷取仍在進行中。")
+                st.rerun()
+        if st.button("⏹️ 取消擷取", key=f"cancel_{job.job_id}"):
+            get_job_runner().cancel(job.job_id, st.session_state.subscriber_id)
+            append_to_log("⏹️ 已送出取消要求 (若有其他使用者共用此工作，將繼續為他們執行)。")
+            st.session_state.active_job_id = None
+            st.rerun()
+        return
+
+    st.session_state.active_job_id = None
+    if job.telemetry is not None and job.telemetry.spans:
+        st.session_state.run_telemetry = {"path": job.telemetry.export_jsonl(), "summary": job.telemetry.summary_lines()}
+    st.session_state.debug_captures = list(job.telemetry.captures.items) if job.telemetry is not None and job.telemetry.captures else None
+    if job.status == "done" and job.result["reports"] is not None and job.result["partial_error"]:
+        apply_scrape_result(job.result)
+        st.session_state.job_notice = ("warning", f"⚠️ 擷取中途發生錯誤，以下為已完成頁面的結果 ({job.result['row_count']} 筆)。錯誤: {job.result['partial_error']}")
+    elif job.status == "done" and job.result["reports"] is not None:
+        apply_scrape_result(job.result)
+        st.session_state.job_notice = ("success", "🎉 WMS 任務完成！")
+    elif job.status == "done":
+        st.session_state.job_notice = ("warning", "⚠️ WMS 抓取完成，但沒有收到任何資料。")
+        append_to_log("⚠️ 警告：抓取完成，但回傳資料為空。", level="WARNING")
+    elif job.status == "canceled":
+        st.session_state.job_notice = ("warning", "⏹️ 擷取已取消。")
+    else:
+        append_to_log(f"❌ 發生致命例外錯誤:\n{job.error}", level="ERROR")
+        st.session_state.job_notice = ("error", "❌ 執行 WMS 任務時發生致命錯誤，請查看最下方的「系統日誌」！")
+    st.rerun()
+
+if st.session_state.get('active_job_id'):
+    job_progress_panel()
+
+job_notice = st.session_state.pop('job_notice', None)
+if job_notice:
+    getattr(st, job_notice[0])(job_notice[1])
 
 # =================================================================================
-# 顯示成功切換分頁的除錯截圖
+# 除錯擷取 (僅在側邊欄開啟時產生，只存在本次執行的記憶體中)
+# =================================================================================
+debug_captures = st.session_state.get('debug_captures')
+if debug_captures:
+    with st.expander(f"📸 除錯擷取畫面 ({len(debug_captures)})", expanded=job_notice is not None and job_notice[0] == "error"):
+        st.caption("「切換分頁後」請確認是否有反白停留在「揀包完成/Picked」。")
+        for i, capture in enumerate(debug_captures):
+            st.image(capture["png"], caption=f"{capture['captured_at']} {capture['label']}")
+            if capture["dom"]:
+                st.download_button("下載列表 HTML", capture["dom"].encode("utf-8"), f"debug_list_{i + 1}.html", mime="text/html", key=f"debug_dom_{i}")
+
 # =================================================================================
-if os.path.exists("debug_tab_switched.png"):
-    st.info("📸 [除錯輔助] 機器人切換分頁後的畫面（請確認是否有反白停留在「揀包完成/Picked」）：")
-    st.image("debug_tab_switched.png")
-    os.remove("debug_tab_switched.png")
+# 報告預覽：列數少時顯示全文；超過 PREVIEW_TEXT_MAX_ROWS 時改為統計摘要 + 分頁表格，
+# 全文只在按下「準備複製」或下載時才產生，頁面大小不隨筆數增加
+# =================================================================================
+PREVIEW_TEXT_MAX_ROWS = 300
+PREVIEW_PAGE_ROWS = 100
+
+def render_report_tab(name, copy_label, file_prefix, custom_header, extra_downloads=None):
+    downloads = st.session_state.report_downloads
+    display_timestamp = st.session_state.display_timestamp
+    raw_text = st.session_state.report_texts[name]
+    full_text = lambda: f"{custom_header}\n\n{raw_text}" if custom_header.strip() else raw_text
+    row_count = downloads.row_count(name)
+    large = row_count > PREVIEW_TEXT_MAX_ROWS
+
+    col1, col2, col3 = st.columns([0.4, 0.3, 0.3])
+    with col1:
+        if not large or st.session_state.get(f"copy_ready_{name}"):
+            create_copy_button(full_text(), copy_label, key=f"copy_{name}")
+        elif st.button(f"📋 準備複製全文 ({row_count} 筆)", key=f"prepare_copy_{name}", use_container_width=True):
+            st.session_state[f"copy_ready_{name}"] = True
+            st.rerun()
+    with col2:
+        st.download_button("下載 CSV", lambda: downloads.csv(name), f"{file_prefix}_{st.session_state.file_timestamp}.csv", mime="text/csv", use_container_width=True, key=f"download_csv_{name}")
+    with col3:
+        st.download_button("下載 TXT", lambda: downloads.txt(name, display_timestamp, custom_header), f"{file_prefix}_{st.session_state.file_timestamp}.txt", mime="text/plain", use_container_width=True, key=f"download_txt_{name}")
+    if extra_downloads:
+        extra_downloads()
+
+    if not large:
+        show_text_area("預覽內容", full_text(), f"text_{name}", 450)
+        return
+    summary = f"擷取時間: {display_timestamp} (台北時間)\n\n{downloads.summary(name)}"
+    st.code(f"{custom_header}\n\n{summary}" if custom_header.strip() else summary, language=None)
+    page_count = -(-row_count // PREVIEW_PAGE_ROWS)
+    page = st.number_input(f"明細頁次 (共 {page_count} 頁，每頁 {PREVIEW_PAGE_ROWS} 筆)", min_value=1, max_value=page_count, value=1, step=1, key=f"preview_page_{name}")
+    start = (int(page) - 1) * PREVIEW_PAGE_ROWS
+    st.dataframe(downloads.export_frame(name).iloc[start:start + PREVIEW_PAGE_ROWS], hide_index=True, use_container_width=True)
+
+def render_table_downloads():
+    downloads = st.session_state.report_downloads
+    col4, col5 = st.columns(2)
+    with col4:
+        st.download_button("下載 Excel (各組分頁)", lambda: downloads.xlsx(), f"WMS_{st.session_state.file_timestamp}.xlsx", mime=XLSX_MIME,
+                           disabled=EXCEL_ENGINE is None, help=None if EXCEL_ENGINE else "需要安裝 openpyxl", use_container_width=True)
+    with col5:
+        st.download_button("下載 Parquet", lambda: downloads.parquet(), f"WMS_{st.session_state.file_timestamp}.parquet", mime="application/octet-stream",
+                           disabled=not PARQUET_AVAILABLE, help=None if PARQUET_AVAILABLE else "需要安裝 pyarrow", use_container_width=True)
 
 if st.session_state.get('wms_scraping_done', False):
     st.markdown("---")
@@ -495,53 +334,41 @@ if st.session_state.get('wms_scraping_done', False):
     if canceled_count > 0:
         st.error(f"⚠️ 注意！偵測到 {canceled_count} 筆「已取消」的訂單！", icon="🚨")
 
+    store_diff = st.session_state.get('store_diff')
+    if store_diff is not None:
+        with st.expander(f"🆕 與上次擷取相比：新增 {len(store_diff['new'])} 筆，新取消 {len(store_diff['newly_canceled'])} 筆"):
+            st.markdown("**本次新增**")
+            st.dataframe(store_diff['new'], hide_index=True, use_container_width=True)
+            st.markdown("**新變成已取消**")
+            st.dataframe(store_diff['newly_canceled'], hide_index=True, use_container_width=True)
+
+    account_outcomes = st.session_state.get('account_outcomes')
+    if account_outcomes:
+        st.markdown("**👥 各帳號擷取結果**")
+        st.dataframe(pd.DataFrame([{"帳號": name, "筆數": o["rows"], "完整": o["complete"], "錯誤": o["error"] or ""} for name, o in account_outcomes.items()]),
+                     hide_index=True, use_container_width=True)
+
     tab_titles = ['第一組', '第二組', '第三組', '第四組', '第五組', '其他'] + ["📋 所有項目", f"❌ 已取消訂單 ({canceled_count})" if canceled_count > 0 else "❌ 已取消訂單"]
     tabs = st.tabs(tab_titles)
     
+    # 下載內容以函式傳入，只在按下時才從快照快取取用，輸入自訂文字時的重跑不會重建檔案
     groups_for_loop = ['第一組', '第二組', '第三組', '第四組', '第五組', '其他']
     for i, g in enumerate(groups_for_loop):
         with tabs[i]:
             if st.session_state.report_texts.get(g):
-                raw_text = st.session_state.report_texts[g]
-                combined_text = f"{custom_header}\n\n{raw_text}" if custom_header.strip() else raw_text
-                
-                df_g = st.session_state.final_df[st.session_state.final_df['分組'] == g]
-                
-                col1, col2, col3 = st.columns([0.4, 0.3, 0.3])
-                with col1: create_copy_button(combined_text, f"一鍵複製 {g} 報告", key=f"copy_{g}")
-                with col2:
-                    st.download_button("下載 CSV", df_g.drop(columns=['分組', '狀態'], errors='ignore').to_csv(index=False, encoding='utf-8-sig'), f"{g}_{st.session_state.file_timestamp}.csv", use_container_width=True)
-                with col3:
-                    st.download_button("下載 TXT", combined_text.encode('utf-8'), f"{g}_{st.session_state.file_timestamp}.txt", use_container_width=True)
-                st.text_area("預覽內容", value=combined_text, height=450, key=f"text_{g}", label_visibility="collapsed")
+                render_report_tab(g, f"一鍵複製 {g} 報告", g, custom_header)
             else:
                 st.info(f"{g} 目前無資料。")
                 
     with tabs[6]:
-        raw_text = st.session_state.report_texts.get('all', '')
-        if raw_text:
-            combined_text = f"{custom_header}\n\n{raw_text}" if custom_header.strip() else raw_text
-            col1, col2, col3 = st.columns([0.4, 0.3, 0.3])
-            with col1: create_copy_button(combined_text, "一鍵複製所有項目", key="copy_all")
-            with col2:
-                st.download_button("下載 CSV", st.session_state.final_df.drop(columns=['分組', '狀態'], errors='ignore').to_csv(index=False, encoding='utf-8-sig'), f"ALL_{st.session_state.file_timestamp}.csv", use_container_width=True)
-            with col3:
-                st.download_button("下載 TXT", combined_text.encode('utf-8'), f"ALL_{st.session_state.file_timestamp}.txt", use_container_width=True)
-            st.text_area("預覽內容", value=combined_text, height=450, key="text_all", label_visibility="collapsed")
+        if st.session_state.report_texts.get('all'):
+            render_report_tab('all', "一鍵複製所有項目", "ALL", custom_header, extra_downloads=render_table_downloads)
         else:
             st.info("目前無資料。")
 
     with tabs[7]:
         if canceled_count > 0:
-            raw_text = st.session_state.report_texts.get('canceled', '')
-            combined_text = f"{custom_header}\n\n{raw_text}" if custom_header.strip() else raw_text
-            col1, col2, col3 = st.columns([0.4, 0.3, 0.3])
-            with col1: create_copy_button(combined_text, "一鍵複製已取消", key="copy_canceled")
-            with col2:
-                st.download_button("下載 CSV", st.session_state.df_canceled.drop(columns=['分組'], errors='ignore').to_csv(index=False, encoding='utf-8-sig'), f"CANCELED_{st.session_state.file_timestamp}.csv", use_container_width=True)
-            with col3:
-                st.download_button("下載 TXT", combined_text.encode('utf-8'), f"CANCELED_{st.session_state.file_timestamp}.txt", use_container_width=True)
-            st.text_area("預覽內容", value=combined_text, height=450, key="text_canceled", label_visibility="collapsed")
+            render_report_tab('canceled', "一鍵複製已取消", "CANCELED", custom_header)
         else:
             st.info("沒有已取消的訂單。")
 
@@ -550,7 +377,26 @@ if st.session_state.get('wms_scraping_done', False):
 # =================================================================================
 st.markdown("---")
 st.subheader("🛠️ 系統日誌 (Logs)")
+run_telemetry = st.session_state.get('run_telemetry')
+if run_telemetry:
+    st.markdown("**⏱️ 各階段耗時與資源**")
+    st.code("\n".join(run_telemetry["summary"]), language=None)
+    if os.path.exists(run_telemetry["path"]):
+        st.download_button("下載執行紀錄 (JSON lines)", lambda: read_file_bytes(run_telemetry["path"]), os.path.basename(run_telemetry["path"]), key="download_run_telemetry")
 if st.session_state.app_logs:
-    full_log_text = "\n".join(st.session_state.app_logs)
-    create_copy_button(full_log_text, "📋 一鍵複製完整日誌以供除錯", key="copy_sys_logs")
-    st.text_area("日誌內容：", value=full_log_text, height=300, key="sys_log_area", label_visibility="collapsed")
+    level_labels = {"DEBUG": "全部 (含細部步驟)", "INFO": "一般訊息以上", "WARNING": "僅警告與錯誤"}
+    min_level = st.selectbox("顯示等級", options=list(level_labels), format_func=level_labels.get, key="log_level")
+    log_text = "\n".join(line for level, line in st.session_state.app_logs if LOG_LEVELS[level] >= LOG_LEVELS[min_level])
+    st.caption(f"頁面只保留最近 {UI_LOG_LINES} 則訊息，完整日誌請下載日誌檔。")
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.session_state.get("copy_ready_logs"):
+            create_copy_button(log_text, "📋 一鍵複製日誌以供除錯", key="copy_sys_logs")
+        elif st.button("📋 準備複製日誌", key="prepare_copy_logs", use_container_width=True):
+            st.session_state.copy_ready_logs = True
+            st.rerun()
+    with col2:
+        run_log_path = st.session_state.get('run_log_path')
+        if run_log_path and os.path.exists(run_log_path):
+            st.download_button("下載完整日誌檔", lambda: read_file_bytes(run_log_path), os.path.basename(run_log_path), mime="text/plain", key="download_run_log", use_container_width=True)
+    show_text_area("日誌內容：", log_text, "sys_log_area", 300)
@@ -0,0 +1,88 @@
+import pandas as pd
+
+import fake_wms
+import wms_core as core
+
+DISPLAY_TIMESTAMP = "2026-10-17 09:00"
+
+# =================================================================================
+# 原本逐組呼叫 to_string 的報告產生方式 (比對用的標準輸出)
+# =================================================================================
+def reference_report_text(df_to_process, display_timestamp, report_title, show_status=False):
+    cols_to_drop = ['分組'] if show_status else ['分組', '狀態']
+    df_display = df_to_process.drop(columns=[c for c in cols_to_drop if c in df_to_process.columns])
+    if df_display.empty:
+        return f"擷取時間: {display_timestamp} (台北時間)\n\n--- {report_title} ---\n\n此分類下無資料。"
+
+    summary_lines = ["==============================", f"=== {report_title} ===", "=============================="]
+    summary_df = df_display.groupby('寄送方式', observed=False).size().reset_index(name='數量')
+    max_len = summary_df['寄送方式'].astype(str).str.len().max() + 2 if not summary_df.empty else 10
+    for _, row in summary_df.iterrows():
+        if row['數量'] > 0:
+            method_part = f"{row['寄送方式']}:"
+            summary_lines.append(f"{method_part:<{max_len}} {str(row['數量']):>8}")
+    summary_lines.append("\n------------------------------")
+    summary_lines.append(f"總計: {len(df_display)}")
+    return (f"擷取時間: {display_timestamp} (台北時間)\n\n" + "\n".join(summary_lines) + "\n\n"
+            "==============================\n======== 資 料 明 細 ========\n==============================\n\n"
+            + df_display.to_string(index=False))
+
+def reference_reports(df):
+    df_canceled = df[df['狀態'] == '已取消'].copy()
+    df_processing = df[df['狀態'] != '已取消'].copy()
+    df_processing['主要運送代碼'] = df_processing['主要運送代碼'].astype(str)
+    condition = (df_processing['寄送方式'] == '7-11') & (df_processing['主要運送代碼'].str.match(r'^\d', na=False))
+    df_processing.loc[condition, '寄送方式'] = '711大物流'
+    df_processing['分組'] = df_processing['寄送方式'].map(core.GROUP_MAPPING).fillna('其他')
+    df_canceled['分組'] = df_canceled['寄送方式'].map(core.GROUP_MAPPING).fillna('其他')
+
+    methods = df_processing['寄送方式'].unique().tolist()
+    order = [m for m in core.SHIPPING_PRIORITY_ORDER if m in methods] + sorted(m for m in methods if m not in core.SHIPPING_PRIORITY_ORDER)
+    df_processing['寄送方式'] = pd.Categorical(df_processing['寄送方式'], categories=order, ordered=True)
+    df_processing['分組'] = pd.Categorical(df_processing['分組'], categories=core.GROUP_ORDER, ordered=True)
+    df_sorted = df_processing.sort_values(by=['分組', '寄送方式'], kind='stable')
+
+    reports = {}
+    for g in core.GROUP_ORDER:
+        df_g = df_sorted[df_sorted['分組'] == g]
+        reports[g] = reference_report_text(df_g, DISPLAY_TIMESTAMP, f"{g} 統計") if not df_g.empty else None
+    reports['all'] = reference_report_text(df_sorted, DISPLAY_TIMESTAMP, "所有正常項目統計")
+    reports['canceled'] = reference_report_text(df_canceled, DISPLAY_TIMESTAMP, "已取消項目統計", show_status=True)
+    return reports
+
+def new_reports(df):
+    bodies = core.build_reports(df)["bodies"]
+    return {name: None if body is None else core._with_timestamp(body, DISPLAY_TIMESTAMP) for name, body in bodies.items()}
+
+def fake_wms_frame(**overrides):
+    return pd.DataFrame(fake_wms.expected_records({**fake_wms.DEFAULT_CONFIG, **overrides}))
+
+# =================================================================================
+# 測試
+# =================================================================================
+def test_reports_match_reference_on_fake_wms_data():
+    df = fake_wms_frame()
+    expected = reference_reports(df)
+    actual = new_reports(df)
+    assert actual.keys() == expected.keys()
+    for name in expected:
+        assert actual[name] == expected[name], name
+
+def test_group_column_widths_follow_group_rows():
+    df = pd.DataFrame([
+        {"寄送方式": "7-11", "主要運送代碼": "A1", "狀態": "正常"},
+        {"寄送方式": "新竹物流", "主要運送代碼": "H1234567890123", "狀態": "正常"},
+        {"寄送方式": "自取", "主要運送代碼": "X", "狀態": "已取消"},
+    ])
+    assert new_reports(df) == reference_reports(df)
+
+def test_missing_values_render_as_blank():
+    df = pd.DataFrame([
+        {"寄送方式": "黑貓", "主要運送代碼": "T1", "狀態": "正常"},
+        {"寄送方式": None, "主要運送代碼": "T2", "狀態": "正常"},
+    ])
+    reports = new_reports(df)
+    details = reports['其他'].split(core.REPORT_DETAILS_BANNER, 1)[1].splitlines()
+    assert details == ["寄送方式 主要運送代碼", "         T2"]
+    assert "總計: 1" in reports['其他']
+    assert reports['all'].endswith("\n         T2")
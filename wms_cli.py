@@ -0,0 +1,166 @@
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+import traceback
+from zoneinfo import ZoneInfo
+
+# =================================================================================
+# 命令列版本：不載入 Streamlit，執行擷取 + 報告並把 CSV/TXT/JSON 寫入輸出資料夾；
+# --every N 每 N 分鐘擷取一次，期間沿用同一個已登入的瀏覽器
+# =================================================================================
+DEFAULT_OUTPUT_DIR = "wms_output"
+EXIT_OK, EXIT_FAILED, EXIT_PARTIAL = 0, 1, 2
+
+def log(message):
+    timestamp = datetime.datetime.now(ZoneInfo("Asia/Taipei")).strftime("%H:%M:%S")
+    print(f"[{timestamp}] {message}", file=sys.stderr, flush=True)
+
+def status_printer(quiet):
+    # --quiet 只保留警告/錯誤等級與成功 (✅) 訊息
+    def print_status(message, level="INFO"):
+        if not quiet or level in ("WARNING", "ERROR") or message.lstrip().startswith("✅"):
+            log(message)
+    return print_status
+
+def resolve_credentials(args, core):
+    saved = core.load_credentials(core.CREDENTIALS_FILE_WMS)
+    username = args.username or os.environ.get("WMS_USERNAME") or saved.get("username")
+    password = args.password or os.environ.get("WMS_PASSWORD") or saved.get("password")
+    return username, password
+
+def write_outputs(core, result, output_dir):
+    # 每次擷取一個子資料夾：各組/全部/已取消的 CSV 與 TXT，加上 summary.json
+    reports = result["reports"]
+    run_dir = os.path.join(output_dir, reports["file_timestamp"])
+    os.makedirs(run_dir, exist_ok=True)
+    downloads = reports["downloads"]
+    file_prefixes = {**{g: g for g in core.GROUP_ORDER}, "all": "ALL", "canceled": "CANCELED"}
+    files = []
+    for name, prefix in file_prefixes.items():
+        if reports["report_texts"].get(name) is None:
+            continue
+        for extension, payload in (("csv", downloads.csv(name)), ("txt", downloads.txt(name, reports["display_timestamp"]))):
+            path = os.path.join(run_dir, f"{prefix}_{reports['file_timestamp']}.{extension}")
+            with open(path, "wb") as f:
+                f.write(payload)
+            files.append(os.path.basename(path))
+
+    store_diff = result["store_diff"]
+    group_counts = reports["final_df"]["分組"].value_counts()
+    summary = {
+        "captured_at": reports["display_timestamp"],
+        "row_count": result["row_count"],
+        "complete": result["partial_error"] is None,
+        "partial_error": result["partial_error"],
+        "groups": {g: int(group_counts.get(g, 0)) for g in core.GROUP_ORDER},
+        "canceled": len(reports["df_canceled"]),
+        "new": None if store_diff is None else len(store_diff["new"]),
+        "newly_canceled": None if store_diff is None else len(store_diff["newly_canceled"]),
+        "accounts": result.get("accounts"),
+        "files": files,
+    }
+    with open(os.path.join(run_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    return run_dir
+
+def write_debug_captures(telemetry, output_dir):
+    # 除錯擷取只在 --debug-capture 時產生，依執行編號分資料夾，不與其他執行混用
+    capture_dir = os.path.join(output_dir, "debug", telemetry.run_id)
+    os.makedirs(capture_dir, exist_ok=True)
+    for i, capture in enumerate(telemetry.captures.items, start=1):
+        with open(os.path.join(capture_dir, f"{i:02d}_{capture['label']}.png"), "wb") as f:
+            f.write(capture["png"])
+        if capture["dom"]:
+            with open(os.path.join(capture_dir, f"{i:02d}_{capture['label']}.html"), "w", encoding="utf-8") as f:
+                f.write(capture["dom"])
+    return capture_dir
+
+def run_once(core, args, username, password, session_manager, accounts=None):
+    options = {"scrape_mode": args.scrape_mode, "keep_browser": session_manager is not None, "incremental": args.incremental,
+               "parallel_workers": args.parallel_workers, "browser_profile": args.browser_profile,
+               "maximize_page_size": not args.keep_page_size, "date_filter": args.today_only}
+    telemetry = core.RunTelemetry(debug_capture=args.debug_capture)
+    try:
+        if accounts:
+            result = core.run_multi_account_pipeline(accounts, options, status_printer(args.quiet), telemetry=telemetry,
+                                                     session_manager=session_manager, max_browsers=args.max_browsers)
+        else:
+            result = core.run_scrape_pipeline(args.url, username, password, options, status_printer(args.quiet),
+                                              telemetry=telemetry, session_manager=session_manager)
+    except Exception:
+        log(f"❌ 擷取失敗:\n{traceback.format_exc()}")
+        return EXIT_FAILED
+    finally:
+        if telemetry.spans:
+            telemetry.export_jsonl()
+        if telemetry.captures and telemetry.captures.items:
+            log(f"📸 除錯擷取已儲存至 {write_debug_captures(telemetry, args.output_dir)}")
+
+    if result["reports"] is None:
+        log("⚠️ 擷取完成，但沒有收到任何資料。")
+        return EXIT_OK
+    run_dir = write_outputs(core, result, args.output_dir)
+    log(f"✅ 已輸出 {result['row_count']} 筆資料至 {run_dir}")
+    return EXIT_PARTIAL if result["partial_error"] else EXIT_OK
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="WMS 資料擷取 (命令列版本，不需 Streamlit)")
+    parser.add_argument("--url", help="預設為 wms_core.DEFAULT_WMS_URL")
+    parser.add_argument("--username", help="預設讀取環境變數 WMS_USERNAME，其次為介面儲存的帳密檔")
+    parser.add_argument("--password", help="預設讀取環境變數 WMS_PASSWORD，其次為介面儲存的帳密檔")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--scrape-mode", choices=["dom", "network"], default="dom")
+    parser.add_argument("--browser-profile", choices=["full", "lean"], default="full")
+    parser.add_argument("--parallel-workers", type=int, default=1)
+    parser.add_argument("--keep-page-size", action="store_true", help="沿用清單預設的每頁筆數 (預設會改為最大的選項以減少翻頁)")
+    parser.add_argument("--today-only", action="store_true", help="套用 WMS 清單的日期篩選，只擷取今日資料")
+    parser.add_argument("--incremental", action="store_true", help="寫入本機資料庫，連續兩頁皆為已知資料即停止翻頁 (停止位置之後的訂單不會重新檢查是否取消，請定期完整擷取)")
+    parser.add_argument("--accounts", metavar="FILE", help="多帳號清單 JSON (格式同介面儲存的 wms_accounts.json)，同時擷取並合併報告")
+    parser.add_argument("--max-browsers", type=int, default=2, help="多帳號擷取時同時執行的瀏覽器上限")
+    parser.add_argument("--every", type=float, metavar="N", help="每 N 分鐘擷取一次 (沿用已登入的瀏覽器)，Ctrl+C 結束")
+    parser.add_argument("--debug-capture", action="store_true", help="保留切換分頁與錯誤時的截圖及列表 HTML (寫入輸出資料夾的 debug/)")
+    parser.add_argument("--quiet", action="store_true", help="只顯示成功/警告/錯誤訊息")
+    args = parser.parse_args(argv)
+
+    # 解析參數後才載入爬蟲核心 (pandas；selenium 於開始擷取時才載入)，--help 與參數錯誤不需等待
+    import wms_core as core
+    args.url = args.url or core.DEFAULT_WMS_URL
+
+    accounts = None
+    if args.accounts:
+        accounts = core.load_accounts(args.accounts, args.url)
+        if not accounts:
+            parser.error(f"帳號清單 {args.accounts} 沒有可用的帳號 (需要 username 與 password)")
+        username = password = None
+    else:
+        username, password = resolve_credentials(args, core)
+        if not (username and password):
+            parser.error("缺少 WMS 帳號或密碼 (--username/--password 或環境變數 WMS_USERNAME/WMS_PASSWORD)")
+
+    session_manager = None
+    if args.every:
+        # 閒置逾時需大於輪詢間隔，瀏覽器才會留到下一次擷取；多帳號時每個帳號各保留一個瀏覽器 (上限 --max-browsers)
+        session_manager = core.BrowserSessionManager(max_browsers=max(1, args.max_browsers) if accounts else 1,
+                                                     idle_timeout=max(core.BROWSER_IDLE_TIMEOUT, args.every * 60 * 2))
+    exit_code = EXIT_OK
+    try:
+        while True:
+            started = time.monotonic()
+            exit_code = run_once(core, args, username, password, session_manager, accounts)
+            if not args.every:
+                break
+            delay = max(0.0, args.every * 60 - (time.monotonic() - started))
+            log(f"下一次擷取於 {delay:.0f} 秒後。")
+            time.sleep(delay)
+    except KeyboardInterrupt:
+        log("已中止。")
+    finally:
+        if session_manager is not None:
+            session_manager.close_all()
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main())
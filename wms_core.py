@@ -0,0 +1,2320 @@
+import pandas as pd
+import datetime
+import time
+import json
+import os
+import traceback
+import threading
+import hashlib
+import queue
+import copy
+import uuid
+import sqlite3
+import io
+import re
+import subprocess
+import importlib.util
+from contextlib import closing, contextmanager
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from shutil import which
+from zoneinfo import ZoneInfo
+
+# =================================================================================
+# Selenium 延遲載入：介面、CLI 啟動與報告產生都不需要，建立 AutomationTool 時才載入
+# =================================================================================
+webdriver = By = Keys = Options = Service = WebDriverWait = EC = None
+TimeoutException = NoSuchElementException = None
+_selenium_lock = threading.Lock()
+
+def load_selenium():
+    global webdriver, By, Keys, Options, Service, WebDriverWait, EC, TimeoutException, NoSuchElementException
+    with _selenium_lock:
+        if webdriver is not None:
+            return
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.common.keys import Keys
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.chrome.service import Service
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.common.exceptions import TimeoutException, NoSuchElementException
+        from selenium import webdriver as selenium_webdriver
+        webdriver = selenium_webdriver
+
+# =================================================================================
+# 核心爬蟲邏輯
+# =================================================================================
+ACCOUNT_INPUT_XPATH = "//input[@placeholder='example@jenjan.com.tw']"
+PASSWORD_INPUT_XPATH = "//input[@type='password']"
+ROW_XPATH = "//div[contains(@class, 'list-items')]/div[contains(@class, 'item')]"
+CANCELED_DOT_XPATH = ".//div[contains(@class, 'm-pre-dot') and contains(text(), '已取消')]"
+NEXT_BUTTON_XPATH = "//button[normalize-space()='下一頁' or normalize-space()='Next']"
+LOADING_SPINNER_XPATH = "//div[contains(@class, 'j-loading')]"
+COUNTER_LABEL_XPATH = "(//div[contains(@class, 'item') and .//label[contains(@class, 'm-check')]])[1]//label[contains(@class, 'm-check')]"
+# 尋找 class 包含 btn，且其內部文字包含「揀包完成」的區塊
+PICKING_COMPLETE_TAB_XPATH = "//div[contains(@class, 'btn') and contains(., '揀包完成')]"
+# 分頁按鈕是否為目前分頁 (active/selected/current class 或 aria-selected)；同一排都沒有標記時回傳 unknown
+TAB_STATE_JS = """
+const tab = document.evaluate(arguments[0], document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+if (!tab) return 'missing';
+const isActive = (el) => /(^|[\\s-])(active|selected|current)(\\s|$)/.test(el.className || '') || el.getAttribute('aria-selected') === 'true';
+if (isActive(tab)) return 'active';
+const siblings = tab.parentElement ? Array.from(tab.parentElement.children) : [];
+return siblings.some(isActive) ? 'inactive' : 'unknown';
+"""
+# 分頁列 = 「下一頁」按鈕往上三層內、不包含清單 (list-items) 的最外層容器；清單列內的元素一律排除
+NOT_IN_LIST = "[not(ancestor::div[contains(@class, 'list-items')])]"
+PAGER_XPATH = NEXT_BUTTON_XPATH + "/ancestor::*[position()<=3][not(descendant::div[contains(@class, 'list-items')])][last()]"
+PAGE_NUMBER_BUTTON_XPATH = PAGER_XPATH + "//*[self::button or self::a or self::li or self::span][normalize-space()='{page}']" + NOT_IN_LIST
+PAGE_NUMBER_INPUT_XPATH = PAGER_XPATH + "//input[not(@type='checkbox') and not(@type='hidden')]" + NOT_IN_LIST
+# 每頁筆數選單：原生 select (選項皆為數字且標示每頁) 或文字為「N 筆/頁」的下拉項目；
+# arguments[0] 為要套用的筆數 (null = 只讀取)，回傳 {kind, current, options}
+PAGE_SIZE_JS = r"""
+const sizeLabel = /^(\d+)\s*(?:筆|笔|條|条|項|项|個|个)?\s*\/\s*(?:頁|页|page)$/i;
+const parseSize = (text) => { const m = (text || '').trim().match(sizeLabel) || (text || '').trim().match(/^(\d+)$/); return m ? Number(m[1]) : null; };
+const target = arguments[0];
+for (const select of document.querySelectorAll('select')) {
+    const options = Array.from(select.options).map(o => [o, parseSize(o.textContent) ?? parseSize(o.value)]);
+    if (options.length < 2 || options.some(([, size]) => size === null)) continue;
+    const labelled = options.some(([o]) => sizeLabel.test(o.textContent.trim())) || /每頁|每页|per page/i.test(select.parentElement ? select.parentElement.textContent : '');
+    if (!labelled) continue;
+    const selected = options[select.selectedIndex];
+    if (target !== null) {
+        const option = options.find(([, size]) => size === target);
+        if (option) {
+            select.value = option[0].value;
+            select.dispatchEvent(new Event('input', {bubbles: true}));
+            select.dispatchEvent(new Event('change', {bubbles: true}));
+        }
+    }
+    return {kind: 'select', current: selected ? selected[1] : null, options: options.map(([, size]) => size)};
+}
+const items = Array.from(document.querySelectorAll('li, span, div, a')).filter(el => el.children.length === 0 && sizeLabel.test(el.textContent.trim()));
+if (!items.length) return null;
+const sizes = Array.from(new Set(items.map(el => parseSize(el.textContent))));
+if (target !== null) {
+    const item = items.find(el => parseSize(el.textContent) === target);
+    if (item) item.click();
+}
+return {kind: 'dropdown', current: null, options: sizes};
+"""
+
+# 清單篩選區的日期區間欄位：只找 list-items 往上四層內、清單以外的 type=date 或日期選擇器元件中的 input，
+# 最多兩格；arguments[0] 為要填入的日期 (字串 = 各格同一天，陣列 = 依序還原原值)，回傳 {inputs, previous}
+DATE_FILTER_JS = """
+const values = arguments[0];
+const list = document.querySelector('.list-items');
+if (!list) return null;
+const pickers = '.el-date-editor, .ant-picker, .mx-datepicker, .flatpickr-input, [class*="datepicker"], [class*="date-picker"], [class*="date-editor"]';
+const isDateInput = (input) => input.offsetParent !== null && !list.contains(input) && (input.type === 'date' || input.closest(pickers) !== null);
+let inputs = [];
+for (let area = list.parentElement, depth = 0; area && depth < 4 && !inputs.length; area = area.parentElement, depth++) {
+    inputs = Array.from(area.querySelectorAll('input')).filter(isDateInput).slice(0, 2);
+}
+const previous = inputs.map(input => input.value);
+const setter = Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, 'value').set;
+inputs.forEach((input, i) => {
+    setter.call(input, Array.isArray(values) ? values[i] : values);
+    input.dispatchEvent(new Event('input', {bubbles: true}));
+    input.dispatchEvent(new Event('change', {bubbles: true}));
+});
+return {inputs: inputs, previous: previous};
+"""
+
+PAGE_COUNT_JS = r"""
+const next = document.evaluate(arguments[0], document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+let pager = next ? next.parentElement : null;
+// 往上最多三層找分頁列，但不進入包含清單的容器 (避免把列內的數字當成頁碼)
+for (let depth = 0; depth < 3 && pager && !pager.querySelector('.list-items'); depth++, pager = pager.parentElement) {
+    const total = (pager.textContent || '').match(/共\s*(\d+)\s*頁/);
+    if (total) return Number(total[1]);
+    const numbers = Array.from(pager.querySelectorAll('button, a, li, span'))
+        .map(e => e.textContent.trim()).filter(t => /^\d+$/.test(t)).map(Number);
+    if (numbers.length) return Math.max(...numbers);
+}
+return null;
+"""
+
+# 平行擷取：每個 Chromium 約需的記憶體，用來依可用記憶體限制工作者數量
+MAX_PARALLEL_WORKERS = 6
+BROWSER_MEMORY_MB = 350
+
+def available_memory_mb():
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+# 瀏覽器設定檔：full 為原本的完整瀏覽器；lean 封鎖圖片/字型/媒體/分析追蹤並使用 eager 載入策略，
+# 以降低 Chromium 記憶體與載入時間。CSS 預設不封鎖，因為 spinner 等元素的顯示/隱藏依賴樣式表
+LEAN_BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp4", "*.webm", "*.mp3", "*.wav",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*facebook.net*", "*hotjar.com*", "*clarity.ms*",
+]
+BROWSER_PROFILES = {
+    "full": {
+        "window_size": "1920,1080", "page_load_strategy": "normal", "extra_args": [],
+        "block_images": False, "block_css": False, "blocked_url_patterns": [],
+    },
+    "lean": {
+        "window_size": "1280,800", "page_load_strategy": "eager",
+        "extra_args": ["--disable-extensions", "--disable-background-networking", "--disable-sync",
+                       "--disable-default-apps", "--no-first-run", "--mute-audio", "--blink-settings=imagesEnabled=false"],
+        "block_images": True, "block_css": False, "blocked_url_patterns": LEAN_BLOCKED_URL_PATTERNS,
+    },
+}
+
+PAGE_LOAD_METRICS_JS = """
+const nav = performance.getEntriesByType('navigation')[0];
+const resources = performance.getEntriesByType('resource');
+const bytes = resources.reduce((sum, r) => sum + (r.transferSize || 0), nav ? (nav.transferSize || 0) : 0);
+return {
+    load_ms: nav ? Math.round((nav.loadEventEnd || performance.now()) - nav.startTime) : null,
+    dom_content_loaded_ms: nav ? Math.round(nav.domContentLoadedEventEnd - nav.startTime) : null,
+    resources: resources.length,
+    transfer_kb: Math.round(bytes / 1024),
+};
+"""
+
+# 各等待步驟的逾時秒數，可透過 AutomationTool(wait_timeouts={...}) 個別覆寫
+DEFAULT_WAIT_TIMEOUTS = {
+    "login_form": 20, "login_field": 10, "login_submit": 20, "post_login": 10,
+    "nav_menu": 30, "page_settle": 10, "tab_button": 20, "tab_switch": 15,
+    "list_ready": 15, "page_label": 10, "page_turn": 30, "api_response": 30,
+}
+# 列表內容需維持不變多久才視為載入完成
+ROW_SETTLE_SECONDS = 0.5
+
+ROW_SIGNATURE_JS = """
+const snapshot = document.evaluate(arguments[0], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+const first = snapshot.snapshotLength ? snapshot.snapshotItem(0).textContent.slice(0, 200) : '';
+return snapshot.snapshotLength + '|' + first;
+"""
+
+class ListChanged:
+    # 列表 (列數或第一列內容) 與點擊前不同
+    def __init__(self, signature_before):
+        self.signature_before = signature_before
+
+    def __call__(self, driver):
+        return driver.execute_script(ROW_SIGNATURE_JS, ROW_XPATH) != self.signature_before
+
+class RowsSettled:
+    # 列表在 settle 秒內都沒有再變動
+    def __init__(self, settle=ROW_SETTLE_SECONDS):
+        self.settle = settle
+        self.signature = None
+        self.since = 0.0
+
+    def __call__(self, driver):
+        signature = driver.execute_script(ROW_SIGNATURE_JS, ROW_XPATH)
+        now = time.time()
+        if signature != self.signature:
+            self.signature, self.since = signature, now
+            return False
+        return now - self.since >= self.settle
+
+# 欄位配置：寄送方式 / 主要運送代碼位於每列 ./div[2] 的第幾欄。多了「揀包員」欄位時整列右移一格
+DEFAULT_ROW_LAYOUT = {"method": 3, "code": 4, "source": "預設"}
+ROW_LAYOUT_CANDIDATES = [(3, 4), (4, 5)]
+ROW_LAYOUT_PROBE_ROWS = 5
+
+# 每頁判斷一次欄位配置：表頭欄位名稱與候選配置都以前幾列實際讀出的資料評分，取讀到最多列的配置
+ROW_LAYOUT_JS_FN = """
+const first = (xp, ctx) => document.evaluate(xp, ctx, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+const text = (el) => (el.innerText || el.textContent || '').trim();
+const readColumns = (row, methodIdx, codeIdx) => {
+    let method = '', code = '';
+    const methodCol = first(`./div[2]/div[${methodIdx}]`, row);
+    if (!methodCol) return [method, code];
+    method = text(methodCol);
+    const codeCol = first(`./div[2]/div[${codeIdx}]`, row);
+    if (!codeCol) return [method, code];
+    const input = codeCol.querySelector('input');
+    code = input ? String(input.value || '').trim() : text(codeCol);
+    return [method, code];
+};
+const scoreLayout = (rows, method, code, probeRows) => {
+    let score = 0;
+    for (let i = 0; i < Math.min(rows.snapshotLength, probeRows); i++) {
+        const [m, c] = readColumns(rows.snapshotItem(i), method, code);
+        if (m && c) score++;
+    }
+    return score;
+};
+const detectLayout = (rowXpath, candidates, probeRows) => {
+    let header = null;
+    const headerCell = first("//*[normalize-space(text())='寄送方式'][not(ancestor::div[contains(@class, 'list-items')])]", document);
+    if (headerCell && headerCell.parentElement) {
+        const cells = Array.from(headerCell.parentElement.children);
+        const method = cells.indexOf(headerCell) + 1;
+        const codeCell = cells.find(cell => text(cell) === '主要運送代碼');
+        const code = codeCell ? cells.indexOf(codeCell) + 1 : method + 1;
+        header = {method: method, code: code, source: '表頭'};
+    }
+    const rows = document.evaluate(rowXpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    if (!rows.snapshotLength) return header;
+    // 表頭的欄位順序不一定與列內的 div[2] 子元素對齊，讀不到資料時改由候選配置試探
+    let best = null, bestScore = 0;
+    if (header) [best, bestScore] = [header, scoreLayout(rows, header.method, header.code, probeRows)];
+    for (const [method, code] of candidates) {
+        const score = scoreLayout(rows, method, code, probeRows);
+        if (score > bestScore) [best, bestScore] = [{method: method, code: code, source: '首列試探'}, score];
+    }
+    return best;
+};
+"""
+ROW_LAYOUT_JS = ROW_LAYOUT_JS_FN + "return detectLayout(arguments[0], arguments[1], arguments[2]);"
+
+# 與 _extract_rows_by_element 相同的解析規則 (依本頁欄位配置與已取消判斷)，但整頁只需一次 WebDriver 往返
+ROW_EXTRACTION_JS = ROW_LAYOUT_JS_FN + """
+const rowXpath = arguments[0], canceledXpath = arguments[1], fallback = arguments[4];
+const layout = detectLayout(rowXpath, arguments[2], arguments[3]) || fallback;
+const snapshot = document.evaluate(rowXpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+const records = [];
+for (let i = 0; i < snapshot.snapshotLength; i++) {
+    const row = snapshot.snapshotItem(i);
+    const [method, code] = readColumns(row, layout.method, layout.code);
+    const status = first(canceledXpath, row) ? '已取消' : '正常';
+    if (method || code) records.push({'寄送方式': method, '主要運送代碼': code, '狀態': status});
+}
+return {rows: snapshot.snapshotLength, records: records, layout: layout};
+"""
+
+# 清單 API 的欄位名稱未公開，依常見命名逐一比對
+API_FIELD_CANDIDATES = {
+    "寄送方式": ["寄送方式", "shipping_method", "shippingMethod", "logistics", "logistics_name", "logisticsName",
+              "delivery_method", "deliveryMethod", "ship_type", "shipType", "carrier", "carrier_name"],
+    "主要運送代碼": ["主要運送代碼", "tracking_code", "trackingCode", "tracking_no", "trackingNo", "tracking_number",
+                "trackingNumber", "shipping_no", "shippingNo", "logistics_no", "logisticsNo"],
+    "狀態": ["狀態", "status_name", "statusName", "status", "order_status", "orderStatus", "state"],
+}
+
+def _api_field(item, candidates):
+    for key in candidates:
+        if key in item and item[key] is not None:
+            value = item[key]
+            if isinstance(value, dict):
+                value = value.get("name") or value.get("title") or ""
+            return str(value).strip()
+    return ""
+
+def normalize_api_record(item):
+    shipping_method = _api_field(item, API_FIELD_CANDIDATES["寄送方式"])
+    tracking_code = _api_field(item, API_FIELD_CANDIDATES["主要運送代碼"])
+    raw_status = _api_field(item, API_FIELD_CANDIDATES["狀態"])
+    status = '已取消' if ('取消' in raw_status or 'cancel' in raw_status.lower()) else '正常'
+    return {"寄送方式": shipping_method, "主要運送代碼": tracking_code, "狀態": status}
+
+def find_api_records(payload):
+    # 在 JSON 內遞迴尋找最大的物件陣列，且至少一筆能對應出物流或追蹤碼，才視為清單資料
+    best = None
+    stack = [payload]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            items = [x for x in node if isinstance(x, dict)]
+            if items:
+                records = [r for r in (normalize_api_record(x) for x in items) if r["寄送方式"] or r["主要運送代碼"]]
+                if records and (best is None or len(records) > len(best)):
+                    best = records
+            stack.extend(node)
+    return best
+
+# =================================================================================
+# 執行紀錄 (各階段 span：耗時、筆數、WebDriver 指令數、Chromium 記憶體)
+# =================================================================================
+RUN_LOG_DIR = "run_logs"
+RUN_LOG_KEEP_FILES = 200    # run_logs 內最多保留的檔案數 (執行日誌 .log 與 span .jsonl)，超過時刪除最舊的
+
+def prune_run_logs(directory=RUN_LOG_DIR, keep=RUN_LOG_KEEP_FILES):
+    try:
+        paths = [os.path.join(directory, n) for n in os.listdir(directory) if n.endswith((".log", ".jsonl"))]
+    except OSError:
+        return
+    if len(paths) <= keep:
+        return
+    def mtime(path):
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return 0.0
+    for path in sorted(paths, key=mtime)[:len(paths) - keep]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def _child_pids(pid):
+    # 子程序可能由任一執行緒啟動，需讀取每個 task 的 children
+    children = []
+    try:
+        tasks = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return children
+    for tid in tasks:
+        try:
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                children.extend(int(p) for p in f.read().split())
+        except OSError:
+            pass
+    return children
+
+def _process_rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+def process_tree_rss_mb(root_pid, include_root=True):
+    total = _process_rss_mb(root_pid) if include_root else 0.0
+    stack = _child_pids(root_pid)
+    while stack:
+        pid = stack.pop()
+        total += _process_rss_mb(pid)
+        stack.extend(_child_pids(pid))
+    return total
+
+# 執行日誌：完整內容逐行寫入每次執行的檔案，記憶體只保留最近的訊息 (環狀緩衝區)
+RUN_LOG_BUFFER_LINES = 500
+# 狀態回呼為 status_callback(message, level)，等級由發出訊息處指定 (細部步驟為 DEBUG)，包裝訊息時沿用原等級
+LOG_LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+
+class RunLog:
+    def __init__(self, name, directory=RUN_LOG_DIR, max_lines=RUN_LOG_BUFFER_LINES):
+        self.directory = directory
+        self.path = os.path.join(directory, f"{name}.log")
+        self.entries = deque(maxlen=max_lines)
+        self.total = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+    def add(self, message, level="INFO"):
+        timestamp = datetime.datetime.now(ZoneInfo("Asia/Taipei")).strftime("%H:%M:%S")
+        with self._lock:
+            self.total += 1
+            self.entries.append((self.total, timestamp, level, message))
+            if self._file is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+                prune_run_logs(self.directory)
+            self._file.write(f"[{timestamp}] {level:<7} {message}\n")
+
+    def since(self, cursor):
+        # 回傳 (cursor 之後仍在緩衝區內的訊息, 新的 cursor, 已被擠出緩衝區而略過的則數)
+        with self._lock:
+            entries = [entry for entry in self.entries if entry[0] > cursor]
+            skipped = entries[0][0] - cursor - 1 if entries else 0
+            return entries, self.total, skipped
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+# 除錯擷取：截圖與列表 DOM 只存在該次執行的記憶體中，數量與總大小有上限
+DEBUG_CAPTURE_MAX_COUNT = 6
+DEBUG_CAPTURE_MAX_BYTES = 8 * 1024 * 1024
+DEBUG_DOM_MAX_CHARS = 200_000
+LIST_CONTAINER_HTML_JS = """
+const list = document.querySelector('.list-items');
+return list ? list.outerHTML.slice(0, arguments[0]) : null;
+"""
+
+class DebugCaptures:
+    def __init__(self, max_count=DEBUG_CAPTURE_MAX_COUNT, max_bytes=DEBUG_CAPTURE_MAX_BYTES):
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.items = []
+        self._lock = threading.Lock()
+
+    def total_bytes(self):
+        return sum(item["bytes"] for item in self.items)
+
+    def capture(self, driver, label):
+        png = driver.get_screenshot_as_png()
+        try:
+            dom = driver.execute_script(LIST_CONTAINER_HTML_JS, DEBUG_DOM_MAX_CHARS)
+        except Exception:
+            dom = None
+        item = {"label": label, "captured_at": datetime.datetime.now(ZoneInfo("Asia/Taipei")).strftime("%H:%M:%S"),
+                "png": png, "dom": dom, "bytes": len(png) + len((dom or "").encode("utf-8"))}
+        with self._lock:
+            self.items.append(item)
+            # 超過上限時捨棄最舊的擷取 (至少保留剛加入的這一筆)
+            while len(self.items) > 1 and (len(self.items) > self.max_count or self.total_bytes() > self.max_bytes):
+                self.items.pop(0)
+        return item["bytes"]
+
+class RunTelemetry:
+    def __init__(self, run_id=None, debug_capture=False):
+        self.run_id = run_id or datetime.datetime.now(ZoneInfo("Asia/Taipei")).strftime("%Y%m%d-%H%M%S-") + os.urandom(2).hex()
+        self.captures = DebugCaptures() if debug_capture else None
+        self.spans = []
+        self.listeners = []
+        self.defaults = {}
+        self._lock = threading.Lock()
+        self._commands = {}
+        self._browser_pids = set()
+
+    def child(self, share_listeners=False, **defaults):
+        # 平行工作者用：共用 span 與計數，預設不觸發監聽 (監聽者須為執行緒安全才可共用)
+        child = copy.copy(self)
+        child.listeners = list(self.listeners) if share_listeners else []
+        child.defaults = {**self.defaults, **defaults}
+        return child
+
+    def instrument_driver(self, driver):
+        # 包裝 driver.execute 以計算 WebDriver 指令數 (依執行緒分開計算)；沿用的瀏覽器只包一層
+        original = getattr(driver, "_wms_original_execute", None) or driver.execute
+        driver._wms_original_execute = original
+        def counted_execute(driver_command, params=None):
+            tid = threading.get_ident()
+            with self._lock:
+                self._commands[tid] = self._commands.get(tid, 0) + 1
+            return original(driver_command, params)
+        driver.execute = counted_execute
+        try:
+            self._browser_pids.add(driver.service.process.pid)
+        except AttributeError:
+            pass
+
+    def _thread_commands(self):
+        with self._lock:
+            return self._commands.get(threading.get_ident(), 0)
+
+    def browser_rss_mb(self):
+        return sum(process_tree_rss_mb(pid) for pid in list(self._browser_pids))
+
+    def _emit(self, kind, record):
+        for listener in self.listeners:
+            try:
+                listener(kind, record)
+            except Exception:
+                pass
+
+    @contextmanager
+    def span(self, name, **attrs):
+        # 呼叫端可在 with 區塊內設定 record["rows"]
+        record = {"run_id": self.run_id, "name": name, **self.defaults, **attrs, "rows": attrs.get("rows")}
+        record["started_at"] = datetime.datetime.now(ZoneInfo("Asia/Taipei")).isoformat(timespec="milliseconds")
+        started = time.perf_counter()
+        commands_before = self._thread_commands()
+        self._emit("start", record)
+        record["ok"] = False
+        try:
+            yield record
+            record["ok"] = True
+        finally:
+            record["duration"] = round(time.perf_counter() - started, 4)
+            record["commands"] = self._thread_commands() - commands_before
+            record["rss_mb"] = round(self.browser_rss_mb(), 1)
+            with self._lock:
+                self.spans.append(record)
+            self._emit("end", record)
+
+    def capture(self, driver, label):
+        # 未開啟除錯擷取時不截圖；擷取失敗不影響主流程
+        if self.captures is None:
+            return False
+        try:
+            with self.span("debug_capture", label=label) as record:
+                record["bytes"] = self.captures.capture(driver, label)
+            return True
+        except Exception:
+            return False
+
+    def export_jsonl(self, directory=RUN_LOG_DIR):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.run_id}.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            for record in self.spans:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        prune_run_logs(directory)
+        return path
+
+    def summary_lines(self):
+        summary = {}
+        for record in self.spans:
+            entry = summary.setdefault(record["name"], {"count": 0, "duration": 0.0, "commands": 0, "rows": 0, "rss_mb": 0.0, "failed": 0})
+            entry["count"] += 1
+            entry["duration"] += record["duration"]
+            entry["commands"] += record["commands"]
+            entry["rows"] += record["rows"] or 0
+            entry["rss_mb"] = max(entry["rss_mb"], record["rss_mb"])
+            entry["failed"] += 0 if record["ok"] else 1
+        lines = [f"執行編號 {self.run_id}"]
+        for name, entry in summary.items():
+            failed_note = f"，失敗 {entry['failed']}" if entry["failed"] else ""
+            lines.append(f"{name:<12} 次數 {entry['count']:>3}  耗時 {entry['duration']:>8.2f} 秒  指令 {entry['commands']:>5}  筆數 {entry['rows']:>6}  RSS峰值 {entry['rss_mb']:>7.1f} MB{failed_note}")
+        return lines
+
+# =================================================================================
+# Chromium / ChromeDriver 路徑 (解析一次後快取於磁碟，檔案變動或版本不符時重新解析)
+# =================================================================================
+DRIVER_PATHS_FILE = "wms_driver_paths.json"
+_VERSION_PATTERN = re.compile(r"\d+\.\d+\.\d+\.\d+")
+_driver_paths = None
+_driver_paths_lock = threading.Lock()
+
+def _binary_version(path):
+    try:
+        output = subprocess.run([path, "--version"], capture_output=True, text=True, timeout=15).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    match = _VERSION_PATTERN.search(output)
+    return match.group(0) if match else None
+
+def _file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, int(stat.st_mtime)]
+
+def _major_version(version):
+    return version.split(".")[0] if version else None
+
+def _driver_paths_valid(paths):
+    # 檔案仍在且大小/修改時間未變 (沒有升級) 就沿用，不必每次執行 --version
+    if not isinstance(paths, dict) or not paths.get("driver_path"):
+        return False
+    return all(_file_stamp(paths[f"{kind}_path"]) == paths.get(f"{kind}_stamp") for kind in ("chrome", "driver") if paths.get(f"{kind}_path"))
+
+def resolve_driver_paths(status_callback=None, cache_file=DRIVER_PATHS_FILE):
+    # 回傳 (路徑資訊, 是否來自快取)；同一程序內也只解析一次
+    global _driver_paths
+    notify = status_callback or (lambda message, level="INFO": None)
+    with _driver_paths_lock:
+        if _driver_paths_valid(_driver_paths):
+            return _driver_paths, True
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f: cached = json.load(f)
+        except (OSError, json.JSONDecodeError): cached = None
+        if _driver_paths_valid(cached):
+            _driver_paths = cached
+            return cached, True
+
+        chrome_path = which("chromium") or which("chromium-browser")
+        chrome_version = _binary_version(chrome_path) if chrome_path else None
+        driver_path, source = which("chromedriver"), "system"
+        driver_version = _binary_version(driver_path) if driver_path else None
+        if not driver_path or (chrome_version and driver_version and _major_version(chrome_version) != _major_version(driver_version)):
+            if driver_path:
+                notify(f"  > ⚠️ 系統 ChromeDriver {driver_version} 與 Chromium {chrome_version} 主版本不符，改用 webdriver_manager...", level="WARNING")
+            else:
+                notify("  > 未找到系統 ChromeDriver，啟動 webdriver_manager 自動下載...", level="DEBUG")
+            from webdriver_manager.chrome import ChromeDriverManager
+            driver_path, source = ChromeDriverManager().install(), "webdriver_manager"
+            driver_version = _binary_version(driver_path)
+
+        paths = {"chrome_path": chrome_path, "chrome_version": chrome_version, "chrome_stamp": _file_stamp(chrome_path) if chrome_path else None,
+                 "driver_path": driver_path, "driver_version": driver_version, "driver_stamp": _file_stamp(driver_path), "driver_source": source}
+        if chrome_version and driver_version and _major_version(chrome_version) != _major_version(driver_version):
+            # 版本仍不符時照常嘗試啟動，但不寫入快取，下次重新解析
+            notify(f"  > ⚠️ ChromeDriver {driver_version} 與 Chromium {chrome_version} 主版本不符，可能無法啟動。", level="WARNING")
+        else:
+            try:
+                with open(cache_file, 'w', encoding='utf-8') as f: json.dump(paths, f, ensure_ascii=False, indent=2)
+            except OSError:
+                pass
+        _driver_paths = paths
+        return paths, False
+
+def invalidate_driver_paths(cache_file=DRIVER_PATHS_FILE):
+    # 以快取路徑啟動失敗時呼叫，下一次 (例如重試) 重新解析
+    global _driver_paths
+    with _driver_paths_lock:
+        _driver_paths = None
+        if os.path.exists(cache_file):
+            os.remove(cache_file)
+
+# =================================================================================
+# 瀏覽器工作階段管理 (跨次擷取保留已登入的瀏覽器)
+# =================================================================================
+MAX_LIVE_BROWSERS = 2
+BROWSER_IDLE_TIMEOUT = 15 * 60
+BROWSER_ACQUIRE_TIMEOUT = 120
+
+class BrowserSessionManager:
+    def __init__(self, max_browsers=MAX_LIVE_BROWSERS, idle_timeout=BROWSER_IDLE_TIMEOUT, acquire_timeout=BROWSER_ACQUIRE_TIMEOUT):
+        self.max_browsers = max_browsers
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self._sessions = {}
+        # 平行擷取工作者自行開啟的瀏覽器不保留工作階段，但同樣佔用上限名額
+        self._reserved = 0
+        self._cond = threading.Condition()
+        self._salt = os.urandom(16)
+        self._reaper = None
+
+    def _secret(self, password):
+        # 只存密碼雜湊，用來確認沿用工作階段的人確實知道該帳號密碼
+        return hashlib.sha256(self._salt + password.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _is_alive(driver):
+        try:
+            driver.execute_script("return document.readyState")
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _quit(drivers):
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+    def _pop_expired_locked(self):
+        now = time.time()
+        expired = [k for k, s in self._sessions.items() if not s["in_use"] and now - s["last_used"] > self.idle_timeout]
+        return [self._sessions.pop(k)["driver"] for k in expired]
+
+    def _pop_oldest_idle_locked(self):
+        idle = [(s["last_used"], k) for k, s in self._sessions.items() if not s["in_use"]]
+        if not idle:
+            return None
+        return self._sessions.pop(min(idle)[1])["driver"]
+
+    def acquire(self, url, username, password, create_driver, profile=""):
+        # 回傳 (driver, is_warm)；is_warm 為 True 代表沿用既有瀏覽器，呼叫端須確認登入狀態
+        key = (url, username, profile)
+        secret = self._secret(password)
+        deadline = time.time() + self.acquire_timeout
+        while True:
+            to_quit = []
+            with self._cond:
+                to_quit.extend(self._pop_expired_locked())
+                session = self._sessions.get(key)
+                if session is not None and not session["in_use"]:
+                    session["in_use"] = True
+                    candidate = session
+                elif session is None and len(self._sessions) + self._reserved < self.max_browsers:
+                    self._sessions[key] = {"driver": None, "in_use": True, "secret": secret, "last_used": time.time()}
+                    candidate = None
+                else:
+                    evicted = self._pop_oldest_idle_locked() if session is None else None
+                    if evicted is not None:
+                        to_quit.append(evicted)
+                        candidate = False
+                    else:
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            raise RuntimeError(f"瀏覽器數量已達上限 ({self.max_browsers})，請稍後再試。")
+                        self._cond.wait(min(remaining, 5))
+                        candidate = False
+            self._quit(to_quit)
+
+            if candidate is False:
+                continue
+            if candidate is None:
+                break
+            if candidate["secret"] == secret and self._is_alive(candidate["driver"]):
+                return candidate["driver"], True
+            with self._cond:
+                self._sessions.pop(key, None)
+                self._cond.notify_all()
+            self._quit([candidate["driver"]])
+
+        try:
+            driver = create_driver()
+        except Exception:
+            with self._cond:
+                self._sessions.pop(key, None)
+                self._cond.notify_all()
+            raise
+        with self._cond:
+            self._sessions[key]["driver"] = driver
+        return driver, False
+
+    def release(self, url, username, driver, healthy=True, profile=""):
+        key = (url, username, profile)
+        with self._cond:
+            session = self._sessions.get(key)
+            if session is not None and session["driver"] is driver:
+                if healthy:
+                    session["in_use"] = False
+                    session["last_used"] = time.time()
+                else:
+                    self._sessions.pop(key)
+            self._cond.notify_all()
+        if not healthy or session is None or session["driver"] is not driver:
+            self._quit([driver])
+
+    def reserve(self, count):
+        # 不等待：必要時關閉閒置的瀏覽器騰出名額，回傳實際取得的名額數 (可能少於 count)
+        to_quit, granted = [], 0
+        with self._cond:
+            to_quit.extend(self._pop_expired_locked())
+            while granted < count:
+                if len(self._sessions) + self._reserved < self.max_browsers:
+                    self._reserved += 1
+                    granted += 1
+                    continue
+                evicted = self._pop_oldest_idle_locked()
+                if evicted is None:
+                    break
+                to_quit.append(evicted)
+        self._quit(to_quit)
+        return granted
+
+    def release_reserved(self, count):
+        with self._cond:
+            self._reserved = max(0, self._reserved - count)
+            self._cond.notify_all()
+
+    def close_idle(self):
+        with self._cond:
+            to_quit = self._pop_expired_locked()
+            self._cond.notify_all()
+        self._quit(to_quit)
+
+    def close_all(self):
+        with self._cond:
+            to_quit = [s["driver"] for s in self._sessions.values() if s["driver"] is not None]
+            self._sessions.clear()
+            self._cond.notify_all()
+        self._quit(to_quit)
+
+    def start_reaper(self, interval=60):
+        if self._reaper is not None:
+            return
+        def reap():
+            while True:
+                time.sleep(interval)
+                self.close_idle()
+        self._reaper = threading.Thread(target=reap, name="wms-browser-reaper", daemon=True)
+        self._reaper.start()
+
+class ScrapeCancelled(Exception):
+    pass
+
+# 暫時性失敗 (翻頁逾時、瀏覽器斷線、登入/導覽失敗) 時重新登入並從檢查點續抓
+MAX_SCRAPE_ATTEMPTS = 3
+# 增量擷取：連續幾頁全部為已知資料才停止；這幾頁的已知資料仍會重新讀取狀態 (可找出其中新取消的訂單)
+INCREMENTAL_STOP_PAGES = 2
+RETRY_BACKOFF_SECONDS = 2
+
+class ScrapeCheckpoint:
+    # 單次擷取的進度：已完成的頁面與資料；重試時從第一個缺少的頁面續抓
+    def __init__(self):
+        self.pages = {}
+        self.attempts = 0
+        self.complete = False
+        self.errors = []
+
+    def record(self, page, records):
+        self.pages[page] = records
+
+    @property
+    def next_page(self):
+        page = 1
+        while page in self.pages:
+            page += 1
+        return page
+
+    @property
+    def rows(self):
+        return sum(len(records) for records in self.pages.values())
+
+    def frame(self):
+        return pd.DataFrame([item for page in sorted(self.pages) for item in self.pages[page]])
+
+class AutomationTool:
+    def __init__(self, status_callback=None, extraction_mode="js", scrape_mode="dom", wait_timeouts=None, session_manager=None, parallel_workers=1, known_codes=None, telemetry=None, cancel_event=None, browser_profile="full", max_attempts=MAX_SCRAPE_ATTEMPTS, maximize_page_size=True, date_filter=False):
+        load_selenium()
+        self.status_callback = status_callback
+        # browser_profile 可為 BROWSER_PROFILES 的名稱，或覆寫 full 部分欄位的 dict
+        if isinstance(browser_profile, str):
+            self.browser_profile_name, self.browser_profile = browser_profile, BROWSER_PROFILES[browser_profile]
+        else:
+            self.browser_profile_name, self.browser_profile = "custom", {**BROWSER_PROFILES["full"], **browser_profile}
+        self.cancel_event = cancel_event
+        self.max_attempts = max_attempts
+        self.checkpoint = None
+        self.partial_error = None
+        self.telemetry = telemetry or RunTelemetry()
+        self.known_codes = known_codes
+        self.maximize_page_size = maximize_page_size
+        self.date_filter = date_filter
+        self.list_settings = None
+        self.parallel_workers = parallel_workers
+        self.session_manager = session_manager
+        self.extraction_mode = extraction_mode
+        self._row_layout = None
+        self.scrape_mode = scrape_mode
+        # 網路擷取模式：已收到回應標頭、尚待 loadingFinished 才能讀取內容的請求 (requestId -> url)
+        self._pending_responses = {}
+        # 清單設定沒有重新載入清單時，保留切換分頁時收到的清單回應給第一頁使用
+        self._kept_list_response = None
+        self.wait_timeouts = {**DEFAULT_WAIT_TIMEOUTS, **(wait_timeouts or {})}
+        self.wait_log = []
+
+    def _update_status(self, message, level="INFO"):
+        # 每則狀態訊息同時作為取消檢查點
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise ScrapeCancelled("擷取已被取消")
+        if self.status_callback: 
+            self.status_callback(message, level)
+
+    def _timed_wait(self, driver, name, condition, timeout_key, required=True):
+        started = time.time()
+        try:
+            result = WebDriverWait(driver, self.wait_timeouts[timeout_key], poll_frequency=0.1).until(condition)
+            self.wait_log.append((name, time.time() - started, True))
+            return result
+        except TimeoutException:
+            self.wait_log.append((name, time.time() - started, False))
+            if required:
+                raise
+            return None
+
+    def _report_waits(self):
+        if not self.wait_log:
+            return
+        summary = {}
+        for name, seconds, ok in self.wait_log:
+            entry = summary.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0, "timeouts": 0})
+            entry["count"] += 1
+            entry["total"] += seconds
+            entry["max"] = max(entry["max"], seconds)
+            entry["timeouts"] += 0 if ok else 1
+        total_seconds = sum(seconds for _, seconds, _ in self.wait_log)
+        self._update_status(f"⏱️ 等待時間報告：共 {len(self.wait_log)} 次等待，合計 {total_seconds:.2f} 秒")
+        for name, entry in summary.items():
+            timeout_note = f"，逾時 {entry['timeouts']} 次" if entry["timeouts"] else ""
+            self._update_status(f"  > {name}: {entry['count']} 次，合計 {entry['total']:.2f} 秒，最長 {entry['max']:.2f} 秒{timeout_note}", level="DEBUG")
+
+    def _initialize_driver(self):
+        chrome_options = Options()
+        chrome_options.add_argument("--headless=new") 
+        chrome_options.add_argument("--no-sandbox")
+        chrome_options.add_argument("--disable-dev-shm-usage")
+        chrome_options.add_argument("--disable-gpu")
+        profile = self.browser_profile
+        chrome_options.add_argument(f"--window-size={profile['window_size']}")
+        for arg in profile["extra_args"]:
+            chrome_options.add_argument(arg)
+        chrome_options.page_load_strategy = profile["page_load_strategy"]
+        
+        # 強制瀏覽器使用繁體中文
+        chrome_options.add_argument("--lang=zh-TW")
+        prefs = {"intl.accept_languages": "zh-TW,zh,zh-CN"}
+        if profile["block_images"]:
+            prefs["profile.managed_default_content_settings.images"] = 2
+        chrome_options.add_experimental_option("prefs", prefs)
+        chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
+        if self.scrape_mode == "network":
+            chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+        
+        self._update_status("  > 正在初始化 WebDriver...", level="DEBUG")
+        paths, cached = None, False
+        try:
+            with self.telemetry.span("driver_resolve") as span:
+                paths, cached = resolve_driver_paths(self._update_status)
+                span["cached"] = cached
+            if paths["chrome_path"]:
+                chrome_options.binary_location = paths["chrome_path"]
+                self._update_status(f"  > 找到 Chromium 路徑: {paths['chrome_path']} ({paths['chrome_version'] or '版本未知'})", level="DEBUG")
+            source_label = "快取" if cached else {"system": "系統內建", "webdriver_manager": "webdriver_manager"}[paths["driver_source"]]
+            self._update_status(f"  > 使用 ChromeDriver {paths['driver_version'] or ''} ({source_label}): {paths['driver_path']}", level="DEBUG")
+            service = Service(executable_path=paths["driver_path"])
+            driver = webdriver.Chrome(service=service, options=chrome_options)
+        except Exception as e:
+            if cached:
+                invalidate_driver_paths()
+            self._update_status(f"❌ WebDriver 初始化失敗: {e}", level="ERROR")
+            raise e
+        self._block_resources(driver)
+        return driver
+
+    def _block_resources(self, driver):
+        patterns = list(self.browser_profile["blocked_url_patterns"])
+        if self.browser_profile["block_css"]:
+            patterns.append("*.css")
+        if not patterns:
+            return
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+            self._update_status(f"  > 精簡瀏覽器：已封鎖 {len(patterns)} 種資源 (圖片/字型/媒體/分析追蹤)", level="DEBUG")
+        except Exception as e:
+            self._update_status(f"  > ⚠️ 無法設定資源封鎖: {e}", level="WARNING")
+
+    def _login_wms(self, driver, url, username, password):
+        self._update_status("  > 正在前往 WMS 登入頁面...", level="DEBUG")
+        with self.telemetry.span("page_load", profile=self.browser_profile_name) as span:
+            driver.get(url)
+            try:
+                span.update(driver.execute_script(PAGE_LOAD_METRICS_JS) or {})
+            except Exception:
+                pass
+        account_input = self._timed_wait(driver, "登入表單", EC.element_to_be_clickable((By.XPATH, ACCOUNT_INPUT_XPATH)), "login_form")
+        account_input.click(); account_input.send_keys(username)
+        password_input = self._timed_wait(driver, "密碼欄位", EC.element_to_be_clickable((By.XPATH, PASSWORD_INPUT_XPATH)), "login_field")
+        password_input.click(); password_input.send_keys(password)
+        password_input.send_keys(Keys.ENTER)
+        self._timed_wait(driver, "登入送出", EC.presence_of_element_located((By.ID, "page-container")), "login_submit")
+        self._update_status("✅ [成功] WMS 登入完成！")
+        self._timed_wait(driver, "登入後載入", EC.invisibility_of_element_located((By.XPATH, LOADING_SPINNER_XPATH)), "post_login", required=False)
+        
+    def _navigate_to_picking_complete(self, driver):
+        self._update_status("  > 尋找導覽菜單...", level="DEBUG")
+        picking_management_xpath = "//a[@href='/admin/pickup']"
+        self._timed_wait(driver, "導覽菜單", EC.element_to_be_clickable((By.XPATH, picking_management_xpath)), "nav_menu").click()
+        
+        self._update_status("  > 正在等待並準備切換至「揀包完成」分頁...", level="DEBUG")
+        self._timed_wait(driver, "揀包管理頁載入", EC.invisibility_of_element_located((By.XPATH, LOADING_SPINNER_XPATH)), "page_settle", required=False)
+        
+        try:
+            tab_element = self._timed_wait(driver, "揀包完成分頁按鈕", EC.presence_of_element_located((By.XPATH, PICKING_COMPLETE_TAB_XPATH)), "tab_button")
+            self._update_status("  > 🎯 鎖定目標分頁：揀包完成！準備點擊...", level="DEBUG")
+            
+            driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", tab_element)
+            self._timed_wait(driver, "分頁按鈕可點擊", EC.element_to_be_clickable((By.XPATH, PICKING_COMPLETE_TAB_XPATH)), "tab_button", required=False)
+            list_signature_before = driver.execute_script(ROW_SIGNATURE_JS, ROW_XPATH)
+
+            # 丟棄「未揀訂單」等預設分頁的回應，只保留切換後的清單請求
+            if self.scrape_mode == "network":
+                self._flush_network_log(driver)
+            
+            # 優先使用標準點擊，若被擋住再用 JS 點擊 (確保框架狀態更新)
+            try:
+                tab_element.click()
+            except:
+                driver.execute_script("arguments[0].click();", tab_element)
+            
+            self._update_status("✅ [成功] 已點擊揀包完成頁面！等待系統載入資料...")
+            # 列表內容與切換前不同 (或逾時，例如兩個分頁剛好都沒資料) 再等 spinner 消失
+            self._timed_wait(driver, "切換分頁後列表更新", ListChanged(list_signature_before), "tab_switch", required=False)
+            self._timed_wait(driver, "切換分頁後載入", EC.invisibility_of_element_located((By.XPATH, LOADING_SPINNER_XPATH)), "tab_switch", required=False)
+            
+            self.telemetry.capture(driver, "切換分頁後")
+            
+        except TimeoutException as e:
+            if self.telemetry.capture(driver, "切換分頁失敗"):
+                self._update_status("📸 [除錯] 切換分頁失敗，已擷取錯誤發生時的畫面截圖。")
+            raise e
+
+        # 每次導覽後都重新套用，重試續抓與平行工作者的頁碼才會對應到相同的資料
+        with self.telemetry.span("list_settings") as span:
+            self.list_settings = self._apply_list_settings(driver)
+            span.update(self.list_settings)
+
+    def _reload_list(self, driver, name, action):
+        # 執行會重新載入清單的操作並等待列表更新。網路擷取模式先收下目前的清單回應，
+        # 確定清單有重新載入才捨棄；操作沒有送出請求時，第一頁仍可使用切換分頁時的回應
+        if self.scrape_mode == "network":
+            self._keep_list_responses(driver)
+            stale = set(self._pending_responses)
+        signature_before = driver.execute_script(ROW_SIGNATURE_JS, ROW_XPATH)
+        result = action()
+        changed = self._timed_wait(driver, name, ListChanged(signature_before), "page_settle", required=False)
+        self._wait_list_ready(driver)
+        if self.scrape_mode == "network":
+            if changed:
+                self._kept_list_response = None
+                for request_id in stale:
+                    self._pending_responses.pop(request_id, None)
+            else:
+                self._keep_list_responses(driver)
+        return result, bool(changed)
+
+    def _picking_tab_still_active(self, driver, step):
+        # 套用清單設定 (按 ENTER、切換筆數) 可能觸發查詢並回到「未揀訂單」；離開時切回「揀包完成」並回報
+        if driver.execute_script(TAB_STATE_JS, PICKING_COMPLETE_TAB_XPATH) != "inactive":
+            return True
+        self._update_status(f"  > ⚠️ {step}後離開了「揀包完成」分頁，已切回並沿用預設設定。", level="WARNING")
+        tab_element = driver.find_element(By.XPATH, PICKING_COMPLETE_TAB_XPATH)
+        self._reload_list(driver, "切回揀包完成", lambda: driver.execute_script("arguments[0].click();", tab_element))
+        if driver.execute_script(TAB_STATE_JS, PICKING_COMPLETE_TAB_XPATH) == "inactive":
+            raise NoSuchElementException("無法切回「揀包完成」分頁")
+        return False
+
+    def _apply_list_settings(self, driver):
+        # 選擇清單提供的最大每頁筆數，並 (選用) 套用 WMS 的今日日期篩選，減少需要翻的頁數。
+        # 不套用狀態篩選：報告需要同時列出「已取消」的訂單
+        pages_before = driver.execute_script(PAGE_COUNT_JS, NEXT_BUTTON_XPATH)
+        settings = {"default_page_size": None, "page_size": None, "pages_before": pages_before, "pages": pages_before, "date_filter": False}
+        if self.maximize_page_size:
+            control = driver.execute_script(PAGE_SIZE_JS, None)
+            default_size = (control or {}).get("current") or len(driver.find_elements(By.XPATH, ROW_XPATH)) or None
+            settings["default_page_size"] = settings["page_size"] = default_size
+            largest = max(control["options"]) if control and control["options"] else None
+            if control is None:
+                self._update_status(f"  > 未找到每頁筆數選單，沿用預設 (每頁 {default_size or '?'} 筆)。", level="DEBUG")
+            elif default_size is None or largest > default_size:
+                self._update_status(f"  > 每頁筆數選項 {control['options']}，改為每頁 {largest} 筆...", level="DEBUG")
+                _, changed = self._reload_list(driver, "每頁筆數更新", lambda: driver.execute_script(PAGE_SIZE_JS, largest))
+                if self._picking_tab_still_active(driver, "選擇每頁筆數"):
+                    if changed:
+                        settings["page_size"] = largest
+                    else:
+                        self._update_status("  > ⚠️ 已選擇最大每頁筆數，但清單沒有更新，沿用預設。", level="WARNING")
+        if self.date_filter:
+            today = datetime.datetime.now(ZoneInfo("Asia/Taipei")).strftime("%Y-%m-%d")
+            def fill_dates(values):
+                found = driver.execute_script(DATE_FILTER_JS, values)
+                if found and found["inputs"]:
+                    found["inputs"][-1].send_keys(Keys.ENTER)
+                return found
+            def restore_dates():
+                self._reload_list(driver, "日期篩選還原", lambda: fill_dates(found["previous"]))
+                self._picking_tab_still_active(driver, "還原日期欄位")
+            rows_before = len(driver.find_elements(By.XPATH, ROW_XPATH))
+            found, changed = self._reload_list(driver, "日期篩選更新", lambda: fill_dates(today))
+            if not (found and found["inputs"]):
+                self._update_status("  > ⚠️ 未找到日期篩選欄位，擷取完整清單。", level="WARNING")
+            elif not self._picking_tab_still_active(driver, "套用日期篩選"):
+                # 切回分頁後清單回到預設的每頁筆數
+                settings["page_size"] = settings["default_page_size"]
+            elif rows_before and not driver.find_elements(By.XPATH, ROW_XPATH):
+                # 篩選後整個清單變空，多半是填錯欄位；還原原值，避免整次擷取只回報「沒有資料」
+                self._update_status("  > ⚠️ 套用日期篩選後清單沒有任何資料 (可能不是日期篩選欄位)，已還原並擷取完整清單。", level="WARNING")
+                restore_dates()
+            elif not changed:
+                # 清單沒有重新載入，篩選可能只在之後翻頁時才生效，造成各頁篩選條件不一致；還原原值
+                self._update_status("  > 套用日期篩選後清單未變動，已還原日期欄位並擷取完整清單。", level="DEBUG")
+                restore_dates()
+            else:
+                settings["date_filter"] = True
+                self._update_status(f"  > 已套用日期篩選 {today}。", level="DEBUG")
+        settings["pages"] = driver.execute_script(PAGE_COUNT_JS, NEXT_BUTTON_XPATH)
+        if settings["page_size"] != settings["default_page_size"] or settings["date_filter"]:
+            self._update_status(f"  > 📄 每頁 {settings['page_size'] or '?'} 筆，總頁數 {pages_before or '?'} → {settings['pages'] or '?'} 頁。", level="DEBUG")
+        return settings
+
+    def _report_page_size_savings(self, checkpoint):
+        # 以實際筆數換算預設每頁筆數需要的頁數，乘上本次平均每次翻頁等待時間估計節省的時間
+        settings = self.list_settings
+        if not settings or not settings["default_page_size"] or settings["page_size"] == settings["default_page_size"] or not checkpoint.pages:
+            return
+        default_pages = -(-checkpoint.rows // settings["default_page_size"])
+        saved_pages = default_pages - len(checkpoint.pages)
+        page_waits = [span["duration"] for span in self.telemetry.spans if span["name"] == "page_wait"]
+        per_page = sum(page_waits) / len(page_waits) if page_waits else 0.0
+        self._update_status(f"📄 每頁 {settings['page_size']} 筆：共 {len(checkpoint.pages)} 頁 (預設每頁 {settings['default_page_size']} 筆需 {default_pages} 頁)，"
+                            f"少翻 {saved_pages} 頁，估計節省約 {saved_pages * per_page:.1f} 秒 (平均每頁等待 {per_page:.2f} 秒)。")
+
+    def _detect_row_layout(self, driver):
+        try:
+            return driver.execute_script(ROW_LAYOUT_JS, ROW_XPATH, ROW_LAYOUT_CANDIDATES, ROW_LAYOUT_PROBE_ROWS) or DEFAULT_ROW_LAYOUT
+        except Exception:
+            return DEFAULT_ROW_LAYOUT
+
+    def _note_row_layout(self, page, layout):
+        # 只在第一頁與欄位配置改變時記錄，同一配置的頁面不重複輸出
+        columns = (int(layout["method"]), int(layout["code"]))
+        if columns == self._row_layout:
+            return
+        description = f"寄送方式=第 {columns[0]} 欄、主要運送代碼=第 {columns[1]} 欄 (依{layout.get('source', '預設')})"
+        if self._row_layout is None:
+            self._update_status(f"  > 欄位配置：{description}", level="DEBUG")
+        else:
+            self._update_status(f"  > ⚠️ 第 {page} 頁欄位配置改變：{description}", level="WARNING")
+        self._row_layout = columns
+
+    def _extract_page_rows(self, driver, page=None):
+        # 優先用一次 execute_script 取回整頁資料 (含欄位配置判斷)；失敗才退回逐元素解析
+        if self.extraction_mode == "js":
+            try:
+                result = driver.execute_script(ROW_EXTRACTION_JS, ROW_XPATH, CANCELED_DOT_XPATH,
+                                               ROW_LAYOUT_CANDIDATES, ROW_LAYOUT_PROBE_ROWS, DEFAULT_ROW_LAYOUT)
+                rows_on_screen = int(result.get("rows", 0))
+                self._note_row_layout(page, result.get("layout") or DEFAULT_ROW_LAYOUT)
+                self._update_status(f"  > 找到 {rows_on_screen} 筆項目，已一次性批次提取。", level="DEBUG")
+                return rows_on_screen, list(result.get("records", []))
+            except Exception as e:
+                self._update_status(f"  > ⚠️ 批次提取失敗，改用逐筆解析: {e}", level="WARNING")
+
+        layout = self._detect_row_layout(driver)
+        self._note_row_layout(page, layout)
+        current_page_rows = driver.find_elements(By.XPATH, ROW_XPATH)
+        self._update_status(f"  > 找到 {len(current_page_rows)} 筆項目，正在依欄位配置提取...", level="DEBUG")
+        return len(current_page_rows), self._extract_rows_by_element(current_page_rows, layout)
+
+    def _parse_page(self, driver, page):
+        with self.telemetry.span("page_parse", page=page) as span:
+            rows_on_screen, records = self._extract_page_rows(driver, page)
+            span["rows"] = len(records)
+        return rows_on_screen, records
+
+    def _extract_rows_by_element(self, current_page_rows, layout=DEFAULT_ROW_LAYOUT):
+        method_xpath = f"./div[2]/div[{int(layout['method'])}]"
+        code_xpath = f"./div[2]/div[{int(layout['code'])}]"
+        single_page_data = []
+        for row in current_page_rows:
+            try:
+                shipping_method = ""
+                tracking_code = ""
+
+                # 欄位位置已由本頁的欄位配置決定，不需逐列試錯
+                method_cols = row.find_elements(By.XPATH, method_xpath)
+                if method_cols:
+                    shipping_method = method_cols[0].text.strip()
+                    tracking_cols = row.find_elements(By.XPATH, code_xpath)
+                    if tracking_cols:
+                        inputs = tracking_cols[0].find_elements(By.XPATH, ".//input")
+                        tracking_code = inputs[0].get_property('value').strip() if inputs else tracking_cols[0].text.strip()
+
+                status = '正常'
+                try:
+                    canceled_div = row.find_elements(By.XPATH, CANCELED_DOT_XPATH)
+                    if canceled_div: status = '已取消'
+                except Exception: pass
+
+                # 只要有抓到物流或追蹤碼，就當作有效資料
+                if shipping_method or tracking_code:
+                    single_page_data.append({
+                        "寄送方式": shipping_method, "主要運送代碼": tracking_code, "狀態": status
+                    })
+            except Exception:
+                continue
+        return single_page_data
+
+    def _wait_list_ready(self, driver):
+        self._update_status("  > 等待資料表載入更新...", level="DEBUG")
+        self._timed_wait(driver, "資料表載入", EC.invisibility_of_element_located((By.XPATH, LOADING_SPINNER_XPATH)), "list_ready", required=False)
+        self._timed_wait(driver, "列表穩定", RowsSettled(), "list_ready", required=False)
+
+    def _page_fully_known(self, records):
+        # 增量擷取：清單新資料在前，連續 INCREMENTAL_STOP_PAGES 頁都已在本機資料庫即可停止
+        if self.known_codes is None or not records:
+            return False
+        return all(item["主要運送代碼"] and item["主要運送代碼"] in self.known_codes for item in records)
+
+    def _on_last_page(self, driver, page):
+        # 翻頁逾時時確認是否其實已在最後一頁 (有些分頁列在最後一頁不會停用「下一頁」)
+        try:
+            total_pages = driver.execute_script(PAGE_COUNT_JS, NEXT_BUTTON_XPATH)
+        except Exception:
+            return False
+        return bool(total_pages) and page >= int(total_pages)
+
+    def _iter_pages(self, driver, start_page=1):
+        # 逐頁產生 (頁碼, 該頁資料)：每頁解析完就交出，後面的頁面出錯時前面的頁面已送出
+        # ⚠️ 關鍵修復 1：取消點擊查詢按鈕！避免網頁重置跳回「未揀訂單」
+        # self._update_status("  > 點擊查詢按鈕以載入資料...")
+        # query_button_xpath = "//div[contains(@class, 'btn-primary')] | //button[contains(@class, 'btn-primary')]"
+        # WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.XPATH, query_button_xpath))).click()
+        
+        with self.telemetry.span("page_wait", page=1):
+            self._wait_list_ready(driver)
+        if start_page > 1:
+            self._update_status(f"  > 從檢查點續抓，跳至第 {start_page} 頁...", level="DEBUG")
+            with self.telemetry.span("page_wait", page=start_page):
+                self._jump_to_page(driver, start_page, 1)
+                self._wait_list_ready(driver)
+        self._update_status("  > 資料已初步載入，開始解析。", level="DEBUG")
+        
+        total_items_collected = 0
+        known_pages = 0
+        page_count = start_page
+        counter_label_xpath = COUNTER_LABEL_XPATH
+        
+        while True:
+            self._update_status(f"  > 準備抓取第 {page_count} 頁的資料...", level="DEBUG")
+            label_text_before_click = ""
+            
+            try:
+                counter_label_element = self._timed_wait(driver, "頁面項目", EC.presence_of_element_located((By.XPATH, counter_label_xpath)), "page_label")
+                label_text_before_click = counter_label_element.text
+            except TimeoutException:
+                self._update_status(f"  > 在第 {page_count} 頁未找到任何項目，抓取結束。", level="DEBUG")
+                break
+
+            rows_on_screen, single_page_data = self._parse_page(driver, page_count)
+            total_items_collected += len(single_page_data)
+
+            # ⚠️ 關鍵修復 3：詳細日誌，讓你知道到底漏抓了多少筆
+            self._update_status(f"✅ 第 {page_count} 頁解析完畢。畫面有 {rows_on_screen} 筆，成功提取 {len(single_page_data)} 筆。累計 {total_items_collected} 筆。")
+            yield page_count, single_page_data
+            known_pages = known_pages + 1 if self._page_fully_known(single_page_data) else 0
+            if known_pages >= INCREMENTAL_STOP_PAGES:
+                self._update_status(f"  > [增量擷取] 連續 {known_pages} 頁 (至第 {page_count} 頁) 全部為已知資料，停止翻頁。", level="DEBUG")
+                break
+
+            # 翻頁失敗不再默默結束：除非確認已在最後一頁，否則拋出例外交由 run_wms_scrape 從檢查點重試
+            try:
+                has_next = self._click_next_button(driver)
+            except NoSuchElementException:
+                self._update_status("  > 找不到「下一頁」按鈕，抓取結束。", level="DEBUG")
+                break
+            if not has_next:
+                self._update_status("  > 「下一頁」按鈕已禁用，抓取結束。", level="DEBUG")
+                break
+            self._update_status("  > 已點擊「下一頁」，正在等待頁面更新...", level="DEBUG")
+            try:
+                with self.telemetry.span("page_wait", page=page_count + 1):
+                    self._timed_wait(driver, "翻頁", lambda d: d.find_element(By.XPATH, counter_label_xpath).text != label_text_before_click, "page_turn")
+            except TimeoutException:
+                if self._on_last_page(driver, page_count):
+                    self._update_status("  > 已在最後一頁，抓取結束。", level="DEBUG")
+                    break
+                raise
+            page_count += 1
+                
+        self._update_status(f"  > 所有資料抓取完成，共 {page_count} 頁，最終總筆數: {total_items_collected}", level="DEBUG")
+
+    def _click_next_button(self, driver):
+        next_button_element = driver.find_element(By.XPATH, NEXT_BUTTON_XPATH)
+        if next_button_element.get_attribute('disabled'):
+            return False
+        driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", next_button_element)
+        next_button_element.click()
+        return True
+
+    # -----------------------------------------------------------------------------
+    # 平行擷取模式：多個已登入的瀏覽器各自直接跳到分配到的頁碼
+    # -----------------------------------------------------------------------------
+    def _turn_page(self, driver):
+        label_before = driver.find_element(By.XPATH, COUNTER_LABEL_XPATH).text
+        if not self._click_next_button(driver):
+            return False
+        self._timed_wait(driver, "翻頁", lambda d: d.find_element(By.XPATH, COUNTER_LABEL_XPATH).text != label_before, "page_turn")
+        return True
+
+    def _jump_to_page(self, driver, page, current_page):
+        # 優先點分頁列上的頁碼，其次輸入頁碼，都沒有才逐頁點「下一頁」
+        label_before = driver.find_element(By.XPATH, COUNTER_LABEL_XPATH).text
+        page_buttons = driver.find_elements(By.XPATH, PAGE_NUMBER_BUTTON_XPATH.format(page=page))
+        page_inputs = driver.find_elements(By.XPATH, PAGE_NUMBER_INPUT_XPATH)
+        if page_buttons:
+            driver.execute_script("arguments[0].click();", page_buttons[0])
+        elif page_inputs:
+            page_inputs[0].clear()
+            page_inputs[0].send_keys(str(page), Keys.ENTER)
+        else:
+            for _ in range(page - current_page):
+                if not self._turn_page(driver):
+                    raise NoSuchElementException(f"第 {page} 頁不存在")
+            return
+        self._timed_wait(driver, "跳頁", lambda d: d.find_element(By.XPATH, COUNTER_LABEL_XPATH).text != label_before, "page_turn")
+
+    def _scrape_page_block(self, driver, pages, open_ended=False, on_page=None, current_page=1):
+        # driver 需停在 current_page 頁 (預設第 1 頁)；open_ended 代表此區塊為最後一段，需一路翻到「下一頁」禁用為止；
+        # on_page(頁碼, (畫面筆數, 資料)) 於每頁完成時呼叫
+        results = {}
+        for page in pages:
+            with self.telemetry.span("page_wait", page=page):
+                if page == current_page + 1:
+                    self._turn_page(driver)
+                elif page != current_page:
+                    self._jump_to_page(driver, page, current_page)
+            current_page = page
+            results[page] = self._parse_page(driver, page)
+            self._update_status(f"  > 第 {page} 頁完成，提取 {len(results[page][1])} 筆。", level="DEBUG")
+            if on_page:
+                on_page(page, results[page])
+        while open_ended:
+            with self.telemetry.span("page_wait", page=current_page + 1):
+                turned = self._turn_page(driver)
+            if not turned:
+                break
+            current_page += 1
+            results[current_page] = self._parse_page(driver, current_page)
+            self._update_status(f"  > 第 {current_page} 頁 (超出預估頁數) 完成，提取 {len(results[current_page][1])} 筆。", level="DEBUG")
+            if on_page:
+                on_page(current_page, results[current_page])
+        return results
+
+    def _run_page_block(self, url, username, password, pages, open_ended, on_page=None):
+        with self.telemetry.span("driver_init"):
+            driver = self._initialize_driver()
+        self.telemetry.instrument_driver(driver)
+        try:
+            with self.telemetry.span("login"):
+                self._login_wms(driver, url, username, password)
+            with self.telemetry.span("navigation"):
+                self._navigate_to_picking_complete(driver)
+            with self.telemetry.span("page_wait", page=pages[0]):
+                self._wait_list_ready(driver)
+            return self._scrape_page_block(driver, pages, open_ended, on_page)
+        finally:
+            driver.quit()
+
+    def _plan_worker_count(self, total_pages):
+        workers = min(self.parallel_workers, MAX_PARALLEL_WORKERS, total_pages)
+        available_mb = available_memory_mb()
+        if available_mb is not None:
+            # 主瀏覽器已在執行，其餘每個工作者需要再開一個瀏覽器
+            workers = min(workers, 1 + int(available_mb // BROWSER_MEMORY_MB))
+        return max(1, workers)
+
+    def _iter_pages_parallel(self, driver, url, username, password):
+        # 各工作者完成一頁就經由佇列交回主執行緒產生，頁碼順序不固定
+        with self.telemetry.span("page_wait", page=1):
+            self._wait_list_ready(driver)
+        total_pages = driver.execute_script(PAGE_COUNT_JS, NEXT_BUTTON_XPATH)
+        workers = self._plan_worker_count(int(total_pages)) if total_pages else 1
+        reserved = 0
+        if workers > 1 and self.session_manager is not None:
+            # 工作者瀏覽器計入共用的瀏覽器上限 (主瀏覽器已由管理器計算)
+            reserved = self.session_manager.reserve(workers - 1)
+            if reserved < workers - 1:
+                self._update_status(f"  > 瀏覽器數量已達上限 ({self.session_manager.max_browsers})，平行瀏覽器由 {workers} 個減為 {1 + reserved} 個。", level="DEBUG")
+            workers = 1 + reserved
+        if workers <= 1:
+            self._update_status(f"  > 無法平行擷取 (偵測頁數: {total_pages or '未知'})，改用逐頁擷取。", level="DEBUG")
+            yield from self._iter_pages(driver)
+            return
+        try:
+            yield from self._run_parallel_blocks(driver, url, username, password, int(total_pages), workers)
+        finally:
+            if reserved:
+                self.session_manager.release_reserved(reserved)
+
+    def _run_parallel_blocks(self, driver, url, username, password, total_pages, workers):
+        # 連續區段分配，每個工作者只需跳頁一次，之後依序翻頁
+        size, extra = divmod(int(total_pages), workers)
+        blocks, start = [], 1
+        for i in range(workers):
+            end = start + size + (1 if i < extra else 0)
+            blocks.append(list(range(start, end)))
+            start = end
+        self._update_status(f"  > 偵測到 {total_pages} 頁，啟動 {workers} 個瀏覽器平行擷取。", level="DEBUG")
+
+        log_queue, page_queue = queue.Queue(), queue.Queue()
+        worker_tools, stats = [], [None] * workers
+        for i in range(workers):
+            worker_tools.append(AutomationTool(
+                status_callback=lambda m, level="INFO", i=i: log_queue.put((f"  [工作者 {i + 1}] {m.strip()}", level)),
+                extraction_mode=self.extraction_mode, wait_timeouts=self.wait_timeouts, browser_profile=self.browser_profile,
+                telemetry=self.telemetry.child(worker=i + 1), cancel_event=self.cancel_event,
+                maximize_page_size=self.maximize_page_size, date_filter=self.date_filter))
+
+        def run_block(i):
+            started = time.time()
+            open_ended = i == workers - 1
+            if i == 0:
+                results = worker_tools[i]._scrape_page_block(driver, blocks[i], open_ended, lambda page, result: page_queue.put((page, result)))
+            else:
+                results = worker_tools[i]._run_page_block(url, username, password, blocks[i], open_ended, lambda page, result: page_queue.put((page, result)))
+            stats[i] = (time.time() - started, results)
+            return results
+
+        def drain():
+            while not log_queue.empty():
+                self._update_status(*log_queue.get())
+            finished = []
+            while not page_queue.empty():
+                finished.append(page_queue.get())
+            return finished
+
+        page_results = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(run_block, i): i for i in range(workers)}
+            pending = set(futures)
+            while pending:
+                _, pending = wait_futures(pending, timeout=0.2)
+                for page, result in drain():
+                    page_results[page] = result
+                    yield page, result[1]
+            for future, i in futures.items():
+                try:
+                    future.result()
+                except ScrapeCancelled:
+                    raise
+                except Exception as e:
+                    self._update_status(f"  > ⚠️ 工作者 {i + 1} 失敗: {e}", level="WARNING")
+        for tool in worker_tools:
+            self.wait_log.extend(tool.wait_log)
+
+        for i, stat in enumerate(stats):
+            if stat is None:
+                continue
+            seconds, results = stat
+            rows = sum(len(records) for _, records in results.values())
+            self._update_status(f"  > 工作者 {i + 1}: 第 {blocks[i][0]}-{max(results or blocks[i])} 頁，共 {len(results)} 頁 {rows} 筆，耗時 {seconds:.1f} 秒 ({rows / seconds if seconds else 0:.1f} 筆/秒)", level="DEBUG")
+
+        # 補抓失敗工作者遺漏的頁面
+        missing = [p for p in range(1, int(total_pages) + 1) if p not in page_results]
+        if missing:
+            self._update_status(f"  > 以主瀏覽器補抓遺漏頁面: {missing}", level="DEBUG")
+            driver.refresh()
+            self._navigate_to_picking_complete(driver)
+            self._wait_list_ready(driver)
+            # 每補抓一頁瀏覽器就停在該頁，下一頁由此跳頁；失敗後頁面狀態不明，重新載入回到第 1 頁
+            current_page = 1
+            for page in missing:
+                try:
+                    retried = self._scrape_page_block(driver, [page], current_page=current_page)
+                    current_page = page
+                except Exception as e:
+                    self._update_status(f"  > ⚠️ 第 {page} 頁補抓失敗: {e}", level="WARNING")
+                    driver.refresh()
+                    self._navigate_to_picking_complete(driver)
+                    self._wait_list_ready(driver)
+                    current_page = 1
+                    continue
+                page_results.update(retried)
+                yield page, retried[page][1]
+        missing_pages = self._check_page_results(page_results, int(total_pages))
+        if missing_pages:
+            raise NoSuchElementException(f"平行擷取後仍缺少第 {missing_pages} 頁")
+
+    def _check_page_results(self, page_results, total_pages):
+        # 檢查所有頁面是否有漏頁、漏列或重複的運送代碼
+        expected_pages = set(range(1, max([total_pages] + list(page_results)) + 1))
+        missing_pages = sorted(expected_pages - set(page_results))
+        short_pages = [p for p, (rows, records) in sorted(page_results.items()) if rows != len(records)]
+        final_data = [item for p in sorted(page_results) for item in page_results[p][1]]
+        codes = Counter(item["主要運送代碼"] for item in final_data if item["主要運送代碼"])
+        duplicated = sorted(code for code, n in codes.items() if n > 1)
+
+        if missing_pages:
+            self._update_status(f"  > ⚠️ 合併檢查：缺少第 {missing_pages} 頁", level="WARNING")
+        if short_pages:
+            self._update_status(f"  > ⚠️ 合併檢查：第 {short_pages} 頁畫面筆數與提取筆數不符", level="WARNING")
+        if duplicated:
+            self._update_status(f"  > ⚠️ 合併檢查：{len(duplicated)} 個運送代碼重複出現，例如 {duplicated[:5]}", level="WARNING")
+        if not (missing_pages or short_pages or duplicated):
+            self._update_status(f"  > 合併檢查通過：{len(page_results)} 頁無重複、無遺漏。", level="DEBUG")
+        self._update_status(f"  > 所有資料抓取完成，共 {len(page_results)} 頁，最終總筆數: {len(final_data)}", level="DEBUG")
+        return missing_pages
+
+    # -----------------------------------------------------------------------------
+    # 網路擷取模式：直接讀取清單 XHR 的 JSON 回應，不解析 DOM
+    # -----------------------------------------------------------------------------
+    def _flush_network_log(self, driver):
+        self._pending_responses.clear()
+        self._kept_list_response = None
+        try:
+            driver.get_log("performance")
+        except Exception:
+            pass
+
+    def _drain_list_responses(self, driver):
+        # 讀出目前累積的 performance log，回傳所有看起來像清單資料的 JSON 回應 (依完成順序)；
+        # 回應內容要等到 loadingFinished 才保證可讀，尚未完成的請求留到下一次輪詢
+        found = []
+        for entry in driver.get_log("performance"):
+            try:
+                message = json.loads(entry["message"])["message"]
+            except (KeyError, ValueError, TypeError):
+                continue
+            method = message.get("method")
+            params = message.get("params", {})
+            if method == "Network.responseReceived":
+                response = params.get("response", {})
+                if params.get("type") in ("XHR", "Fetch") and "json" in response.get("mimeType", ""):
+                    self._pending_responses[params.get("requestId")] = response.get("url", "")
+                continue
+            if method == "Network.loadingFailed":
+                self._pending_responses.pop(params.get("requestId"), None)
+                continue
+            if method != "Network.loadingFinished" or params.get("requestId") not in self._pending_responses:
+                continue
+            url = self._pending_responses.pop(params["requestId"])
+            try:
+                body = driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": params["requestId"]})
+                payload = json.loads(body.get("body", ""))
+            except Exception as e:
+                self._update_status(f"  > ⚠️ [網路擷取] 無法讀取回應內容 ({url}): {e}", level="WARNING")
+                continue
+            records = find_api_records(payload)
+            if records is not None:
+                found.append((url, records))
+        return found
+
+    def _keep_list_responses(self, driver):
+        responses = self._drain_list_responses(driver)
+        if responses:
+            self._kept_list_response = responses[-1]
+
+    def _wait_for_list_response(self, driver):
+        if self._kept_list_response is not None:
+            response, self._kept_list_response = self._kept_list_response, None
+            self.wait_log.append(("API 回應", 0.0, True))
+            return response
+        started = time.time()
+        deadline = started + self.wait_timeouts["api_response"]
+        while time.time() < deadline:
+            responses = self._drain_list_responses(driver)
+            if responses:
+                self.wait_log.append(("API 回應", time.time() - started, True))
+                # 同一動作可能觸發多次請求，以最後一個清單回應為準
+                return responses[-1]
+            time.sleep(0.1)
+        self.wait_log.append(("API 回應", time.time() - started, False))
+        return None
+
+    def _iter_pages_network(self, driver, start_page=1):
+        self._update_status("  > [網路擷取] 等待清單 API 回應...", level="DEBUG")
+        with self.telemetry.span("page_wait", page=1):
+            response = self._wait_for_list_response(driver)
+        if response is None:
+            self._update_status("  > ⚠️ [網路擷取] 未偵測到清單 API 回應，改用 DOM 解析。", level="WARNING")
+            yield from self._iter_pages(driver, start_page)
+            return
+
+        page_count = 1
+        if start_page > 1:
+            self._update_status(f"  > 從檢查點續抓，跳至第 {start_page} 頁...", level="DEBUG")
+            with self.telemetry.span("page_wait", page=start_page):
+                self._flush_network_log(driver)
+                self._jump_to_page(driver, start_page, 1)
+                response = self._wait_for_list_response(driver)
+            if response is None:
+                raise TimeoutException(f"第 {start_page} 頁未收到清單 API 回應")
+            page_count = start_page
+
+        total_items_collected = 0
+        known_pages = 0
+        while True:
+            api_url, records = response
+            total_items_collected += len(records)
+            self._update_status(f"✅ 第 {page_count} 頁 API 解析完畢 ({api_url})。取得 {len(records)} 筆，累計 {total_items_collected} 筆。")
+            yield page_count, records
+            known_pages = known_pages + 1 if self._page_fully_known(records) else 0
+            if known_pages >= INCREMENTAL_STOP_PAGES:
+                self._update_status(f"  > [增量擷取] 連續 {known_pages} 頁 (至第 {page_count} 頁) 全部為已知資料，停止翻頁。", level="DEBUG")
+                break
+
+            try:
+                has_next = self._click_next_button(driver)
+            except NoSuchElementException:
+                self._update_status("  > 找不到「下一頁」按鈕，抓取結束。", level="DEBUG")
+                break
+            if not has_next:
+                self._update_status("  > 「下一頁」按鈕已禁用，抓取結束。", level="DEBUG")
+                break
+            self._update_status("  > 已點擊「下一頁」，正在等待 API 回應...", level="DEBUG")
+
+            with self.telemetry.span("page_wait", page=page_count + 1):
+                response = self._wait_for_list_response(driver)
+            if response is None:
+                if self._on_last_page(driver, page_count):
+                    self._update_status("  > 已在最後一頁，抓取結束。", level="DEBUG")
+                    break
+                raise TimeoutException(f"第 {page_count + 1} 頁未收到清單 API 回應")
+            page_count += 1
+
+        self._update_status(f"  > 所有資料抓取完成，共 {page_count} 頁，最終總筆數: {total_items_collected}", level="DEBUG")
+
+    def _resume_session(self, driver, url, username, password):
+        # 沿用已登入的瀏覽器：回到首頁，若被導回登入表單代表工作階段已過期
+        self._update_status("  > ♻️ 沿用已登入的瀏覽器，確認登入狀態...", level="DEBUG")
+        driver.get(url)
+        def page_state(d):
+            if d.find_elements(By.ID, "page-container"): return "ready"
+            if d.find_elements(By.XPATH, ACCOUNT_INPUT_XPATH): return "login"
+            return False
+        if self._timed_wait(driver, "既有工作階段", page_state, "login_form") == "login":
+            self._update_status("  > 工作階段已過期，重新登入...", level="DEBUG")
+            self._login_wms(driver, url, username, password)
+        else:
+            self._update_status("✅ [成功] WMS 登入完成！(沿用工作階段)")
+
+    def iter_wms_scrape(self, url, username, password, start_page=1):
+        # 逐頁產生 (頁碼, 資料)，可從 start_page 續抓；瀏覽器在產生器結束或被關閉時釋放
+        driver = None
+        healthy = False
+        self.wait_log = []
+        try:
+            is_warm = False
+            with self.telemetry.span("driver_init") as span:
+                if self.session_manager:
+                    driver, is_warm = self.session_manager.acquire(url, username, password, self._initialize_driver, profile=f"{self.scrape_mode}/{self.browser_profile_name}")
+                else:
+                    driver = self._initialize_driver()
+                span["warm"] = is_warm
+            self.telemetry.instrument_driver(driver)
+            with self.telemetry.span("login"):
+                if is_warm:
+                    self._resume_session(driver, url, username, password)
+                else:
+                    self._login_wms(driver, url, username, password)
+            with self.telemetry.span("navigation"):
+                self._navigate_to_picking_complete(driver)
+            with self.telemetry.span("scrape", mode=self.scrape_mode, rows=0) as span:
+                if self.scrape_mode == "network":
+                    pages = self._iter_pages_network(driver, start_page)
+                elif self.parallel_workers > 1 and self.known_codes is None and start_page == 1:
+                    pages = self._iter_pages_parallel(driver, url, username, password)
+                else:
+                    pages = self._iter_pages(driver, start_page)
+                for page, records in pages:
+                    span["rows"] += len(records)
+                    yield page, records
+            healthy = True
+        finally:
+            if driver:
+                if self.session_manager:
+                    # 出錯的瀏覽器狀態不明，直接關閉不放回
+                    self.session_manager.release(url, username, driver, healthy=healthy, profile=f"{self.scrape_mode}/{self.browser_profile_name}")
+                else:
+                    driver.quit()
+            # 先釋放瀏覽器再輸出報告：取消時 _update_status 會拋出 ScrapeCancelled
+            self._report_waits()
+
+    def run_wms_scrape(self, url, username, password, on_page=None):
+        # 依檢查點收集所有頁面：暫時性失敗時等待後重新登入，從第一個未完成的頁面續抓；
+        # 重試用盡時保留已擷取的頁面，原因記錄在 partial_error
+        checkpoint = self.checkpoint = ScrapeCheckpoint()
+        self.partial_error = None
+        self.first_page_seconds = None
+        started = time.perf_counter()
+        while True:
+            checkpoint.attempts += 1
+            try:
+                for page, records in self.iter_wms_scrape(url, username, password, start_page=checkpoint.next_page):
+                    if page in checkpoint.pages:
+                        continue
+                    checkpoint.record(page, records)
+                    if self.first_page_seconds is None:
+                        # 第一頁耗時包含瀏覽器啟動、登入與切換分頁，反映冷啟動成本
+                        self.first_page_seconds = round(time.perf_counter() - started, 3)
+                        self._update_status(f"  > ⏱️ 第一頁於 {self.first_page_seconds:.2f} 秒後取得。", level="DEBUG")
+                    if on_page:
+                        on_page(page, records)
+                checkpoint.complete = True
+                break
+            except ScrapeCancelled:
+                raise
+            except Exception as e:
+                checkpoint.errors.append(f"{type(e).__name__}: {str(getattr(e, 'msg', None) or e).strip()}")
+                if checkpoint.attempts >= self.max_attempts:
+                    if not checkpoint.pages:
+                        raise
+                    self.partial_error = e
+                    break
+                delay = RETRY_BACKOFF_SECONDS * 2 ** (checkpoint.attempts - 1)
+                self._update_status(f"⚠️ 第 {checkpoint.attempts} 次擷取失敗 ({checkpoint.errors[-1]})，已完成 {len(checkpoint.pages)} 頁。"
+                                    f"{delay} 秒後重新登入並從第 {checkpoint.next_page} 頁續抓...", level="WARNING")
+                (self.cancel_event or threading.Event()).wait(delay)
+                self._update_status(f"  > 第 {checkpoint.attempts + 1}/{self.max_attempts} 次嘗試...", level="DEBUG")
+
+        self._report_page_size_savings(checkpoint)
+        if checkpoint.complete:
+            self._update_status(f"✅ 擷取完整：共 {len(checkpoint.pages)} 頁 {checkpoint.rows} 筆 (嘗試 {checkpoint.attempts} 次)。")
+        else:
+            self._update_status(f"⚠️ 擷取不完整 (部分結果)：完成 {len(checkpoint.pages)} 頁 {checkpoint.rows} 筆，第 {checkpoint.next_page} 頁起未擷取。"
+                                f"已嘗試 {checkpoint.attempts} 次，最後錯誤: {checkpoint.errors[-1]}", level="WARNING")
+        return checkpoint.frame()
+
+# =================================================================================
+# 資料處理與報告生成
+# =================================================================================
+GROUP_MAPPING = {
+    '7-11': '第一組', '711大物流': '第一組', '全家': '第一組', '萊爾富': '第一組', '萊爾福': '第一組', 'OK': '第一組', '蝦皮店到店': '第一組',
+    '蝦皮隔日配': '第二組', '蝦皮店到家': '第二組',
+    '順豐特快': '第三組', '順豐國際': '第三組',
+    '黑貓': '第四組',
+    '新竹物流': '第五組'
+}
+
+SHIPPING_PRIORITY_ORDER = [
+    '7-11', '711大物流', '全家', '萊爾富', '萊爾福', 'OK', '蝦皮店到店', 
+    '蝦皮隔日配', '蝦皮店到家', 
+    '順豐特快', '順豐國際', 
+    '黑貓', 
+    '新竹物流'
+]
+
+GROUP_ORDER = ['第一組', '第二組', '第三組', '第四組', '第五組', '其他']
+
+REPORT_DETAILS_BANNER = "==============================\n======== 資 料 明 細 ========\n==============================\n\n"
+
+# 報告內容只由擷取資料決定，以內容雜湊快取 (擷取時間標頭於每次輸出時再加上)
+REPORT_CACHE_SIZE = 16
+_report_cache = OrderedDict()
+_report_cache_lock = threading.Lock()
+
+def frame_content_hash(df):
+    digest = hashlib.sha1("\x1f".join(map(str, df.columns)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def _table_cells(df):
+    # 各欄只轉一次字串 (缺值顯示為空白) 並記下長度，各報告再依自己的列範圍計算欄寬
+    cells = []
+    for name in df.columns:
+        values = df[name].astype(object).where(df[name].notna(), '').astype(str)
+        cells.append((str(name), values, values.str.len().to_numpy()))
+    return cells
+
+def _table_lines(cells, start=0, stop=None):
+    # 與該範圍的 DataFrame.to_string(index=False) 相同的靠右對齊表格 (表頭 + 各列)，欄寬只由範圍內的列決定
+    columns = []
+    for name, values, lengths in cells:
+        part = values.iloc[start:stop]
+        if part.empty:
+            return []
+        width = max(len(name), int(lengths[start:stop].max()))
+        columns.append([name.rjust(width)] + part.str.rjust(width).tolist())
+    return [" ".join(row) for row in zip(*columns)]
+
+def _report_body(report_title, counts, label_width, detail_lines):
+    # counts: 依顯示順序排列的「寄送方式 → 數量」；detail_lines: 表頭 + 該報告的明細列
+    if not detail_lines:
+        return f"--- {report_title} ---\n\n此分類下無資料。"
+    lines = ["==============================", f"=== {report_title} ===", "=============================="]
+    for method, count in counts.items():
+        if count > 0:
+            lines.append(f"{f'{method}:':<{label_width}} {str(count):>8}")
+    lines.append("\n------------------------------")
+    lines.append(f"總計: {len(detail_lines) - 1}")
+    return "\n".join(lines) + "\n\n" + REPORT_DETAILS_BANNER + "\n".join(detail_lines)
+
+def _with_timestamp(body, display_timestamp):
+    return f"擷取時間: {display_timestamp} (台北時間)\n\n{body}"
+
+def build_reports(df):
+    # 單次彙總：整張表只做一次 groupby (是否取消 × 分組 × 寄送方式)，
+    # 明細只對正常訂單排序並轉成字串一次，各組報告取其中連續的列 (欄寬依各組自己的列計算)
+    canceled = (df['狀態'] == '已取消').to_numpy()
+    codes = df['主要運送代碼'].astype(str)
+    methods = df['寄送方式'].mask(~canceled & (df['寄送方式'] == '7-11') & codes.str.match(r'^\d', na=False), '711大物流')
+    frame = df.assign(寄送方式=methods, 主要運送代碼=codes)
+    frame['分組'] = frame['寄送方式'].map(GROUP_MAPPING).fillna('其他')
+    counts = frame.groupby([canceled, '分組', '寄送方式'], sort=False).size()
+    is_canceled = counts.index.get_level_values(0).to_numpy(dtype=bool)
+    processing_counts = counts[~is_canceled].droplevel(0)
+    canceled_counts = counts[is_canceled].droplevel(0).groupby(level=1).sum().sort_index()
+
+    processing_methods = processing_counts.index.get_level_values(1).unique().tolist()
+    processing_order = [m for m in SHIPPING_PRIORITY_ORDER if m in processing_methods] + sorted([m for m in processing_methods if m not in SHIPPING_PRIORITY_ORDER])
+    df_processing = frame[~canceled].copy()
+    df_processing['寄送方式'] = pd.Categorical(df_processing['寄送方式'], categories=processing_order, ordered=True)
+    df_processing['分組'] = pd.Categorical(df_processing['分組'], categories=GROUP_ORDER, ordered=True)
+    df_processing_sorted = df_processing.sort_values(by=['分組', '寄送方式'], kind='stable')
+    df_canceled = frame[canceled]
+
+    label_width = max((len(str(m)) for m in processing_order), default=8) + 2
+    cells = _table_cells(df_processing_sorted.drop(columns=['分組', '狀態']))
+    method_totals = processing_counts.groupby(level=1).sum().reindex(processing_order, fill_value=0)
+    # 各組列數由排序後的表計算 (寄送方式缺值的列不在 groupby 內，但仍列在「其他」的明細中)
+    group_totals = df_processing_sorted['分組'].value_counts(sort=False).reindex(GROUP_ORDER, fill_value=0)
+    grouped = set(processing_counts.index.get_level_values(0))
+
+    bodies, offset = {}, 0
+    for g, total in group_totals.items():
+        if total == 0:
+            bodies[g] = None
+            continue
+        group_counts = (processing_counts.loc[g] if g in grouped else pd.Series(dtype=int)).reindex(processing_order, fill_value=0)
+        bodies[g] = _report_body(f"{g} 統計", group_counts, label_width, _table_lines(cells, offset, offset + total))
+        offset += total
+    bodies['all'] = _report_body("所有正常項目統計", method_totals, label_width, _table_lines(cells))
+
+    canceled_width = max((len(str(m)) for m in canceled_counts.index), default=8) + 2
+    canceled_lines = _table_lines(_table_cells(df_canceled.drop(columns=['分組'])))
+    bodies['canceled'] = _report_body("已取消項目統計", canceled_counts, canceled_width, canceled_lines)
+    return {"final_df": df_processing_sorted, "df_canceled": df_canceled, "bodies": bodies,
+            "downloads": ReportDownloads(df_processing_sorted, df_canceled, bodies)}
+
+# Excel 匯出需要 openpyxl 或 xlsxwriter；Parquet 需要 pyarrow，皆為選用套件
+EXCEL_ENGINE = next((m for m in ("openpyxl", "xlsxwriter") if importlib.util.find_spec(m)), None)
+PARQUET_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+class ReportDownloads:
+    # 同一份擷取快照的下載內容：第一次下載時產生並保留，之後的重跑直接取用；
+    # 自訂文字與擷取時間只在 TXT 前面加上前綴，不重建內容
+    def __init__(self, final_df, df_canceled, bodies):
+        self.final_df = final_df
+        self.df_canceled = df_canceled
+        self.bodies = bodies
+        self._payloads = {}
+        # 可重入：csv/xlsx 的產生過程會再經由 _memo 取用 export_frame
+        self._lock = threading.RLock()
+
+    def _memo(self, key, build):
+        with self._lock:
+            if key not in self._payloads:
+                self._payloads[key] = build()
+            return self._payloads[key]
+
+    def export_frame(self, name):
+        def build():
+            if name == 'canceled':
+                return self.df_canceled.drop(columns=['分組'])
+            df = self.final_df if name == 'all' else self.final_df[self.final_df['分組'] == name]
+            return df.drop(columns=['分組', '狀態'])
+        return self._memo(('frame', name), build)
+
+    def row_count(self, name):
+        return len(self.export_frame(name))
+
+    def summary(self, name):
+        # 報告中明細以前的統計部分 (不含擷取時間)，供大型報告預覽
+        return self._memo(('summary', name), lambda: self.bodies[name].split(REPORT_DETAILS_BANNER, 1)[0].rstrip())
+
+    def csv(self, name):
+        return self._memo(('csv', name), lambda: self.export_frame(name).to_csv(index=False).encode('utf-8-sig'))
+
+    def txt(self, name, display_timestamp, custom_header=""):
+        body = self._memo(('txt', name), lambda: self.bodies[name].encode('utf-8'))
+        prefix = _with_timestamp("", display_timestamp)
+        if custom_header.strip():
+            prefix = f"{custom_header}\n\n{prefix}"
+        return prefix.encode('utf-8') + body
+
+    def parquet(self):
+        def build():
+            frame = pd.concat([self.final_df, self.df_canceled], ignore_index=True)
+            return frame.astype({'寄送方式': str, '分組': str}).to_parquet(index=False)
+        return self._memo(('parquet',), build)
+
+    def xlsx(self):
+        # 每組一張工作表，另加「所有項目」與「已取消」
+        def build():
+            buffer = io.BytesIO()
+            with pd.ExcelWriter(buffer, engine=EXCEL_ENGINE) as writer:
+                for g in GROUP_ORDER:
+                    if self.bodies.get(g) is not None:
+                        self.export_frame(g).to_excel(writer, sheet_name=g, index=False)
+                self.export_frame('all').to_excel(writer, sheet_name='所有項目', index=False)
+                self.export_frame('canceled').to_excel(writer, sheet_name='已取消', index=False)
+            return buffer.getvalue()
+        return self._memo(('xlsx',), build)
+
+class RunningTotals:
+    # 擷取過程中逐頁累加各組數量，分組與 711大物流 判定與 build_reports 相同
+    def __init__(self):
+        self.pages = 0
+        self.rows = 0
+        self.canceled = 0
+        self.groups = dict.fromkeys(GROUP_ORDER, 0)
+
+    def add(self, records):
+        self.pages += 1
+        self.rows += len(records)
+        for item in records:
+            if item['狀態'] == '已取消':
+                self.canceled += 1
+                continue
+            method = item['寄送方式']
+            if method == '7-11' and str(item['主要運送代碼'])[:1].isdigit():
+                method = '711大物流'
+            self.groups[GROUP_MAPPING.get(method, '其他')] += 1
+
+    def snapshot(self):
+        return {"pages": self.pages, "rows": self.rows, "canceled": self.canceled, "groups": dict(self.groups)}
+
+def cached_reports(df):
+    key = frame_content_hash(df)
+    with _report_cache_lock:
+        if key in _report_cache:
+            _report_cache.move_to_end(key)
+            return _report_cache[key], True
+    reports = build_reports(df)
+    with _report_cache_lock:
+        _report_cache[key] = reports
+        while len(_report_cache) > REPORT_CACHE_SIZE:
+            _report_cache.popitem(last=False)
+    return reports, False
+
+def process_and_output_data(df, status_callback, telemetry=None):
+    with (telemetry or RunTelemetry()).span("report", rows=len(df)) as span:
+        result = _process_and_output_data(df, status_callback)
+        span["cached"] = result.pop("cached")
+        return result
+
+def _process_and_output_data(df, status_callback):
+    now = datetime.datetime.now(ZoneInfo("Asia/Taipei"))
+    display_timestamp = now.strftime("%Y-%m-%d %H:%M")
+
+    status_callback("  > 彙總各組與寄送方式數量...", level="DEBUG")
+    reports, cached = cached_reports(df)
+    if cached:
+        status_callback("  > 資料與先前相同，直接使用快取的報告。", level="DEBUG")
+    report_texts = {name: None if body is None else _with_timestamp(body, display_timestamp) for name, body in reports["bodies"].items()}
+
+    status_callback("✅ 資料處理完成！")
+    return {
+        "final_df": reports["final_df"],
+        "df_canceled": reports["df_canceled"],
+        "file_timestamp": now.strftime("%y%m%d%H%M"),
+        "display_timestamp": display_timestamp,
+        "report_texts": report_texts,
+        "downloads": reports["downloads"],
+        "cached": cached,
+    }
+
+# =================================================================================
+# 本機資料庫 (以主要運送代碼為鍵，保留首次/最後出現時間與狀態歷程)
+# =================================================================================
+SCRAPE_STORE_FILE = "wms_scrape_store.sqlite3"
+
+class ScrapeStore:
+    def __init__(self, path=SCRAPE_STORE_FILE):
+        self.path = path
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS shipments (
+                    tracking_code TEXT PRIMARY KEY, shipping_method TEXT, status TEXT,
+                    first_seen TEXT, last_seen TEXT, last_run_id INTEGER
+                );
+                CREATE TABLE IF NOT EXISTS status_history (
+                    tracking_code TEXT, status TEXT, changed_at TEXT, run_id INTEGER
+                );
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id INTEGER PRIMARY KEY AUTOINCREMENT, started_at TEXT,
+                    url TEXT, username TEXT, row_count INTEGER
+                );
+                CREATE INDEX IF NOT EXISTS idx_shipments_last_seen ON shipments(last_seen);
+            """)
+
+    def known_codes(self):
+        with closing(sqlite3.connect(self.path)) as conn:
+            return {row[0] for row in conn.execute("SELECT tracking_code FROM shipments")}
+
+    def record_run(self, df, url, username):
+        # 寫入本次結果，回傳「本次新增」與「新變成已取消」的資料
+        now = datetime.datetime.now(ZoneInfo("Asia/Taipei")).isoformat(timespec="seconds")
+        records = [] if df.empty else df[df['主要運送代碼'].astype(str) != ''].to_dict('records')
+        new_rows, newly_canceled = [], []
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            run_id = conn.execute("INSERT INTO runs (started_at, url, username, row_count) VALUES (?, ?, ?, ?)",
+                                  (now, url, username, len(records))).lastrowid
+            for item in records:
+                code, method, status = str(item['主要運送代碼']), item['寄送方式'], item['狀態']
+                previous = conn.execute("SELECT status FROM shipments WHERE tracking_code = ?", (code,)).fetchone()
+                if previous is None:
+                    conn.execute("INSERT INTO shipments VALUES (?, ?, ?, ?, ?, ?)", (code, method, status, now, now, run_id))
+                    new_rows.append(item)
+                else:
+                    conn.execute("UPDATE shipments SET shipping_method = ?, status = ?, last_seen = ?, last_run_id = ? WHERE tracking_code = ?",
+                                 (method, status, now, run_id, code))
+                if previous is None or previous[0] != status:
+                    conn.execute("INSERT INTO status_history VALUES (?, ?, ?, ?)", (code, status, now, run_id))
+                    if status == '已取消':
+                        newly_canceled.append(item)
+        columns = ['寄送方式', '主要運送代碼', '狀態']
+        return {"run_id": run_id, "new": pd.DataFrame(new_rows, columns=columns), "newly_canceled": pd.DataFrame(newly_canceled, columns=columns)}
+
+    def load_rows(self, since=None, url=None, username=None):
+        # 指定 url/username 時只取最後一次由該帳號擷取到的資料
+        query = ("SELECT shipping_method AS 寄送方式, tracking_code AS 主要運送代碼, status AS 狀態 FROM shipments"
+                 " JOIN runs ON runs.run_id = shipments.last_run_id")
+        conditions, params = [], []
+        if since is not None:
+            conditions.append("last_seen >= ?")
+            params.append(since.isoformat(timespec="seconds"))
+        if username is not None:
+            conditions.append("runs.url = ? AND runs.username = ?")
+            params.extend([url, username])
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        with closing(sqlite3.connect(self.path)) as conn:
+            return pd.read_sql_query(query + " ORDER BY first_seen, tracking_code", conn, params=params)
+
+    def report_frame(self, scraped_df, url=None, username=None):
+        # 報告以資料庫中今日出現過的資料為準，再補上沒有運送代碼 (無法入庫) 的列
+        today_start = datetime.datetime.now(ZoneInfo("Asia/Taipei")).replace(hour=0, minute=0, second=0, microsecond=0)
+        stored = self.load_rows(since=today_start, url=url, username=username)
+        if scraped_df.empty:
+            return stored
+        codeless = scraped_df[scraped_df['主要運送代碼'].astype(str) == '']
+        return pd.concat([stored, codeless], ignore_index=True)
+
+# =================================================================================
+# 背景擷取工作 (與 Streamlit 執行緒分離；相同帳號的同時請求共用同一個工作)
+# =================================================================================
+JOB_WORKERS = 2
+JOB_RESULT_REUSE_SECONDS = 60
+JOB_RETENTION_SECONDS = 30 * 60
+# 會改變擷取結果的選項；這些選項不同的請求不共用同一個工作
+JOB_KEY_OPTIONS = ("scrape_mode", "incremental", "date_filter", "debug_capture")
+
+def _scrape_account(url, username, password, options, status_callback, telemetry, cancel_event, session_manager, store, on_page):
+    # 單一帳號的擷取 + (增量入庫)，回傳 (報告用資料, 與上次相比的差異, 中途失敗原因)
+    tool = AutomationTool(status_callback=status_callback, scrape_mode=options.get("scrape_mode", "dom"),
+                          session_manager=session_manager, parallel_workers=int(options.get("parallel_workers", 1)),
+                          known_codes=store.known_codes() if store else None, telemetry=telemetry, cancel_event=cancel_event,
+                          browser_profile=options.get("browser_profile", "full"),
+                          maximize_page_size=options.get("maximize_page_size", True), date_filter=bool(options.get("date_filter")))
+    result_df = tool.run_wms_scrape(url, username, password, on_page=on_page)
+
+    store_diff = None
+    if store is not None and result_df is not None:
+        store_diff = store.record_run(result_df, url, username)
+        status_callback(f"  > [增量擷取] 本次新增 {len(store_diff['new'])} 筆，新取消 {len(store_diff['newly_canceled'])} 筆。", level="DEBUG")
+        result_df = store.report_frame(result_df, url, username)
+    return result_df, store_diff, tool.partial_error
+
+def run_scrape_pipeline(url, username, password, options, status_callback, telemetry=None, cancel_event=None, session_manager=None, on_progress=None):
+    # 擷取 + (增量入庫) + 報告產生，回傳可直接交給介面顯示的結果；
+    # on_progress(各組累計, 該頁資料) 於每頁擷取完成時呼叫
+    telemetry = telemetry or RunTelemetry()
+    store = ScrapeStore() if options.get("incremental") else None
+    totals = RunningTotals()
+    def on_page(page, records):
+        totals.add(records)
+        if on_progress:
+            on_progress(totals.snapshot(), records)
+    result_df, store_diff, partial_error = _scrape_account(url, username, password, options, status_callback, telemetry,
+                                                           cancel_event, session_manager, store, on_page)
+
+    result = {"store_diff": store_diff, "row_count": 0 if result_df is None else len(result_df), "reports": None,
+              "partial_error": None if partial_error is None else str(partial_error), "accounts": None}
+    if result_df is not None and not result_df.empty:
+        result["reports"] = process_and_output_data(result_df, status_callback, telemetry)
+    return result
+
+def run_multi_account_pipeline(accounts, options, status_callback, telemetry=None, cancel_event=None, session_manager=None, on_progress=None, max_browsers=MAX_LIVE_BROWSERS):
+    # 多帳號同時擷取：瀏覽器一律經由 BrowserSessionManager 取得，其上限即為同時存活的 Chromium 數量；
+    # 各帳號的失敗互不影響，結果合併為含「帳號」欄的報告
+    telemetry = telemetry or RunTelemetry()
+    store = ScrapeStore() if options.get("incremental") else None
+    own_manager = session_manager is None
+    if own_manager:
+        session_manager = BrowserSessionManager(max_browsers=max_browsers)
+    if int(options.get("parallel_workers", 1)) > 1:
+        status_callback("  > 多帳號擷取時每個帳號只使用一個瀏覽器 (忽略平行瀏覽器數量)。", level="DEBUG")
+    account_options = {**options, "parallel_workers": 1}
+    totals, totals_lock = RunningTotals(), threading.Lock()
+
+    def scrape(account):
+        name = account["name"]
+        def account_status(message, level="INFO"):
+            status_callback(f"[{name}] {message.strip()}", level)
+        def on_page(page, records):
+            records = [{"帳號": name, **item} for item in records]
+            with totals_lock:
+                totals.add(records)
+                snapshot = totals.snapshot()
+            if on_progress:
+                on_progress(snapshot, records)
+        return _scrape_account(account["url"], account["username"], account["password"], account_options, account_status,
+                               telemetry.child(share_listeners=True, account=name), cancel_event, session_manager, store, on_page)
+
+    workers = max(1, min(len(accounts), max_browsers, session_manager.max_browsers))
+    status_callback(f"  > 多帳號擷取：共 {len(accounts)} 個帳號，同時最多 {workers} 個瀏覽器。", level="DEBUG")
+    outcomes, frames, new_rows, newly_canceled = {}, [], [], []
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wms-account") as executor:
+            futures = [(executor.submit(scrape, account), account["name"]) for account in accounts]
+            for future, name in futures:
+                try:
+                    result_df, store_diff, partial_error = future.result()
+                except ScrapeCancelled:
+                    raise
+                except Exception as e:
+                    outcomes[name] = {"rows": 0, "error": f"{type(e).__name__}: {str(getattr(e, 'msg', None) or e).strip()}", "complete": False}
+                    status_callback(f"❌ [{name}] 擷取失敗，其他帳號繼續: {outcomes[name]['error']}", level="ERROR")
+                    continue
+                rows = 0 if result_df is None else len(result_df)
+                outcomes[name] = {"rows": rows, "error": None if partial_error is None else str(partial_error), "complete": partial_error is None}
+                if rows:
+                    frames.append(result_df.assign(帳號=name)[['帳號'] + list(result_df.columns)])
+                if store_diff is not None:
+                    new_rows.append(store_diff["new"].assign(帳號=name))
+                    newly_canceled.append(store_diff["newly_canceled"].assign(帳號=name))
+    finally:
+        if own_manager:
+            session_manager.close_all()
+
+    if all(outcome["rows"] == 0 and outcome["error"] for outcome in outcomes.values()):
+        raise RuntimeError("所有帳號皆擷取失敗: " + "; ".join(f"{name}: {o['error']}" for name, o in outcomes.items()))
+    for name, outcome in outcomes.items():
+        state = "完整" if outcome["complete"] else ("部分" if outcome["rows"] else "失敗")
+        status_callback(f"  > 帳號 {name}: {outcome['rows']} 筆 ({state})", level="DEBUG")
+
+    combined = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    store_diff = None
+    if store is not None:
+        store_diff = {"run_id": None, "new": pd.concat(new_rows, ignore_index=True) if new_rows else pd.DataFrame(),
+                      "newly_canceled": pd.concat(newly_canceled, ignore_index=True) if newly_canceled else pd.DataFrame()}
+    problems = [f"{name}: {o['error']}" for name, o in outcomes.items() if o["error"]]
+    result = {"store_diff": store_diff, "row_count": len(combined), "reports": None,
+              "partial_error": "; ".join(problems) or None, "accounts": outcomes}
+    if not combined.empty:
+        result["reports"] = process_and_output_data(combined, status_callback, telemetry)
+    return result
+
+class ScrapeJob:
+    def __init__(self, job_id, key, secret, options):
+        self.job_id = job_id
+        self.key = key
+        self.secret = secret
+        self.options = options
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.telemetry = None
+        self.completed_phases = set()
+        self.progress = None
+        self._rows = []
+        self.subscribers = set()
+        self.cancel_event = threading.Event()
+        self.created_at = time.time()
+        self.finished_at = None
+        self.log = RunLog(f"job-{job_id}")
+        self._lock = threading.Lock()
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed", "canceled")
+
+    def add_event(self, message, level="INFO"):
+        self.log.add(message, level)
+
+    def events_since(self, cursor):
+        return self.log.since(cursor)
+
+    def on_progress(self, totals, records):
+        with self._lock:
+            self.progress = totals
+            self._rows.extend(records)
+
+    def partial_frame(self):
+        # 擷取途中已完成頁面的資料，供先行產生報告
+        with self._lock:
+            return pd.DataFrame(self._rows)
+
+    def on_span(self, kind, span):
+        if kind == "end" and span["ok"]:
+            self.completed_phases.add(span["name"])
+
+class ScrapeJobRunner:
+    def __init__(self, session_manager=None, max_workers=JOB_WORKERS):
+        self.session_manager = session_manager
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="wms-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._salt = os.urandom(16)
+
+    def _purge_locked(self):
+        now = time.time()
+        for job_id in [j.job_id for j in self._jobs.values() if j.done and now - j.finished_at > JOB_RETENTION_SECONDS]:
+            del self._jobs[job_id]
+
+    def submit(self, url, username, password, options, subscriber, accounts=None):
+        # 回傳 (job, shared)；shared 為 True 代表加入了既有工作 (進行中或剛完成)
+        # accounts 為多帳號清單 (name/url/username/password)，提供時忽略 url/username/password
+        if accounts:
+            key = tuple((a["url"], a["username"]) for a in accounts)
+            password = "\0".join(a["password"] for a in accounts)
+        else:
+            key = (url, username)
+        key += tuple(options.get(name) for name in JOB_KEY_OPTIONS)
+        secret = hashlib.sha256(self._salt + password.encode("utf-8")).hexdigest()
+        with self._lock:
+            self._purge_locked()
+            for job in self._jobs.values():
+                fresh = job.status == "done" and time.time() - job.finished_at <= JOB_RESULT_REUSE_SECONDS
+                if job.key == key and job.secret == secret and (not job.done or fresh):
+                    job.subscribers.add(subscriber)
+                    return job, True
+            job = ScrapeJob(uuid.uuid4().hex[:12], key, secret, options)
+            job.subscribers.add(subscriber)
+            self._jobs[job.job_id] = job
+        self._executor.submit(self._run, job, url, username, password, accounts)
+        return job, False
+
+    def _run(self, job, url, username, password, accounts=None):
+        if job.cancel_event.is_set():
+            job.log.close()
+            job.finished_at = time.time()
+            job.status = "canceled"
+            return
+        job.status = "running"
+        job.telemetry = RunTelemetry(debug_capture=bool(job.options.get("debug_capture")))
+        job.telemetry.listeners.append(job.on_span)
+        session_manager = self.session_manager if job.options.get("keep_browser") else None
+        status = "failed"
+        try:
+            if accounts:
+                job.result = run_multi_account_pipeline(accounts, job.options, job.add_event, telemetry=job.telemetry,
+                                                        cancel_event=job.cancel_event, session_manager=session_manager,
+                                                        on_progress=job.on_progress, max_browsers=int(job.options.get("max_browsers", MAX_LIVE_BROWSERS)))
+            else:
+                job.result = run_scrape_pipeline(url, username, password, job.options, job.add_event,
+                                                 telemetry=job.telemetry, cancel_event=job.cancel_event, session_manager=session_manager,
+                                                 on_progress=job.on_progress)
+            status = "done"
+        except ScrapeCancelled:
+            job.add_event("⏹️ 擷取已取消。")
+            status = "canceled"
+        except Exception:
+            job.error = traceback.format_exc()
+        finally:
+            job.log.close()
+            # 先記錄完成時間再公開最終狀態：其他執行緒看到 done 時 finished_at 必定已設定
+            job.finished_at = time.time()
+            job.status = status
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id, subscriber):
+        # 只有在沒有其他工作階段等待此結果時才真的中止
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.subscribers.discard(subscriber)
+            if not job.subscribers:
+                job.cancel_event.set()
+
+DEFAULT_WMS_URL = "https://wms.jenjan.com.tw/"
+CREDENTIALS_FILE_WMS = "credentials_wms.json"
+ACCOUNTS_FILE_WMS = "wms_accounts.json"
+def load_credentials(file_path):
+    if os.path.exists(file_path):
+        try:
+            with open(file_path, 'r') as f: return json.load(f)
+        except (json.JSONDecodeError, FileNotFoundError): return {}
+    return {}
+def save_credentials(file_path, username, password):
+    with open(file_path, 'w') as f: json.dump({"username": username, "password": password}, f)
+def clear_credentials(file_path):
+    if os.path.exists(file_path): os.remove(file_path)
+
+def normalize_accounts(items, default_url=DEFAULT_WMS_URL):
+    # 多帳號清單：[{"name": "客戶A", "url": "...", "username": "...", "password": "..."}, ...]；
+    # 缺帳密的項目略過，名稱預設為帳號且不可重複 (作為報告的「帳號」欄)
+    accounts, names = [], set()
+    for item in items:
+        item = {k: str(v).strip() for k, v in item.items() if isinstance(v, str) and str(v).strip()}
+        if not item.get("username") or not item.get("password"):
+            continue
+        name = item.get("name") or item["username"]
+        if name in names:
+            name = f"{name} ({item['username']})"
+        names.add(name)
+        accounts.append({"name": name, "url": item.get("url") or default_url, "username": item["username"], "password": item["password"]})
+    return accounts
+def load_accounts(file_path, default_url=DEFAULT_WMS_URL):
+    if not os.path.exists(file_path):
+        return []
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f: raw = json.load(f)
+    except (json.JSONDecodeError, FileNotFoundError): return []
+    return normalize_accounts(raw if isinstance(raw, list) else [], default_url)
+def fill_saved_passwords(items, saved_accounts, default_url=DEFAULT_WMS_URL):
+    # 介面不回傳已儲存的密碼：密碼欄空白的列沿用同一 URL + 帳號已儲存的密碼
+    saved = {(a["url"], a["username"]): a["password"] for a in saved_accounts}
+    filled = []
+    for item in items:
+        item = dict(item)
+        password, username, url = item.get("password"), item.get("username"), item.get("url")
+        if not (isinstance(password, str) and password.strip()) and isinstance(username, str):
+            url = url.strip() if isinstance(url, str) and url.strip() else default_url
+            item["password"] = saved.get((url, username.strip()))
+        filled.append(item)
+    return filled
+def save_accounts(file_path, accounts):
+    with open(file_path, 'w', encoding='utf-8') as f: json.dump(accounts, f, ensure_ascii=False, indent=2)